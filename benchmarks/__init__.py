@@ -0,0 +1,8 @@
+"""
+离线基准测试，全部使用本地服务或不经过网络的下载器:
+    python -m benchmarks.crawl_throughput    下载器 x 并发数的完整爬取吞吐量、延迟和内存
+    python -m benchmarks.engine_scheduling   引擎调度开销
+    python -m benchmarks.micro               Scheduler/Processor/Item/Response.xpath 微基准
+    python -m benchmarks.startup             短任务从启动到发出第一个请求的耗时
+    python -m benchmarks.results a.json b.json   对比两次 --output 保存的结果
+"""
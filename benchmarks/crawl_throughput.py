@@ -0,0 +1,147 @@
+"""
+完整爬取的吞吐量测试，不依赖外部网络
+
+启动本地合成页面服务，分别用不同下载器和 CONCURRENCY 爬取全部页面，
+输出每秒页面数、下载延迟 p50/p99 和峰值内存:
+    python -m benchmarks.crawl_throughput --pages 2000 --latency 0.01 --concurrency 8 32 128 --output crawl.json
+
+每次爬取都在单独的进程中运行，峰值内存互不影响
+"""
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from benchmarks.results import save_results
+from benchmarks.server import BenchServer
+from pyler.core.stats import StatsCollector
+from pyler.crawler import CrawlerProcess
+from pyler.httplib.request import Request
+from pyler.settings import Settings
+from pyler.spiders import Spider
+
+DOWNLOADERS = {
+    "aiohttp": "pyler.core.downloader.AIOHTTPDownloader",
+    "httpx": "pyler.core.downloader.HTTPXDownloader"
+}
+
+
+class RecordingStatsCollector(StatsCollector):
+    """额外保存每次下载的原始耗时，用于计算精确的分位数"""
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self.latencies: List[float] = []
+
+    def observe(self, key: str, value: float):
+        super().observe(key, value)
+        if key == "downloader/latency_seconds":
+            self.latencies.append(value)
+
+
+class BenchSpider(Spider):
+
+    def start_requests(self):
+        yield Request(self.crawler.settings.get("BENCH_START_URL"), callback=self.parse)
+
+    def parse(self, response):
+        for href in response.xpath("//a/@href").getall():
+            yield Request(response.urljoin(href), callback=self.parse)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位是字节，Linux 上是 KB
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _crawl(downloader: str, concurrency: int, start_url: str) -> Dict:
+    settings = Settings({
+        "DOWNLOADER": DOWNLOADERS[downloader],
+        "CONCURRENCY": concurrency,
+        "CONCURRENCY_PER_DOMAIN": concurrency,
+        "CONNECTION_LIMIT": concurrency,
+        "STATS_CLASS": "benchmarks.crawl_throughput.RecordingStatsCollector",
+        "STATS_LOG_INTERVAL": 0,
+        "LOG_LEVEL": "WARNING",
+        "BENCH_START_URL": start_url
+    })
+    process = CrawlerProcess(settings)
+
+    async def run():
+        await process.crawl(BenchSpider)
+        await process.start()
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    crawler = next(iter(process.crawlers))
+    pages = crawler.stats.get_value("downloader/response_count", 0)
+    latencies = crawler.stats.latencies
+    return {
+        "name": f"{downloader}[concurrency={concurrency}]",
+        "downloader": downloader,
+        "concurrency": concurrency,
+        "pages": pages,
+        "elapsed": elapsed,
+        "pages_per_sec": pages / elapsed,
+        "latency_p50_ms": _percentile(latencies, .5) * 1000,
+        "latency_p99_ms": _percentile(latencies, .99) * 1000,
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+async def _run(args) -> List[Dict]:
+    server = BenchServer(
+        args.host, args.port, pages=args.pages, size=args.size, latency=args.latency, fanout=args.fanout
+    )
+    await server.start()
+    loop = asyncio.get_running_loop()
+    results = []
+    try:
+        for downloader in args.downloaders:
+            for concurrency in args.concurrency:
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    result = await loop.run_in_executor(pool, _crawl, downloader, concurrency, server.start_url)
+                results.append(result)
+                print(
+                    f"{result['name']:<28} pages={result['pages']:<6} {result['pages_per_sec']:>8.1f} pages/s "
+                    f"p50={result['latency_p50_ms']:.1f}ms p99={result['latency_p99_ms']:.1f}ms "
+                    f"rss={result['peak_rss_mb']:.1f}MB"
+                )
+    finally:
+        await server.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=10_000, help="page size in bytes")
+    parser.add_argument("--latency", type=float, default=0., help="server side latency in seconds")
+    parser.add_argument("--fanout", type=int, default=10, help="links per page")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--downloaders", nargs="+", choices=list(DOWNLOADERS), default=list(DOWNLOADERS))
+    parser.add_argument("--output", help="save results as JSON")
+    args = parser.parse_args()
+    results = asyncio.run(_run(args))
+    if args.output:
+        params = {key: value for key, value in vars(args).items() if key != "output"}
+        save_results(args.output, "crawl_throughput", results, params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+引擎调度开销的微基准测试
+
+使用不经过网络的下载器，测量每个请求在调度器、下载槽和任务管理上花费的时间:
+    python -m benchmarks.engine_scheduling --requests 20000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.results import save_results
+from pyler.core.downloader import Downloader
+from pyler.crawler import CrawlerProcess
+from pyler.httplib.request import Request
+from pyler.httplib.response import Response
+from pyler.settings import Settings
+from pyler.spiders import Spider
+
+
+class NullDownloader(Downloader):
+    """直接返回空响应的下载器"""
+
+    async def download(self, request):
+        return Response(request.url, request=request, headers={}, body=b"")
+
+
+class FanoutSpider(Spider):
+    """一次性产生全部请求, 队列基本不会被取空"""
+
+    total = 0
+
+    def start_requests(self):
+        for i in range(self.total):
+            yield Request(f"http://bench-{i % 64}.local/{i}", callback=self.parse)
+
+    def parse(self, response):
+        yield from ()
+
+
+class ChainSpider(Spider):
+    """每个响应只产生下一个请求, 每次调度前队列都是空的"""
+
+    total = 0
+
+    def start_requests(self):
+        yield Request("http://bench.local/0", callback=self.parse)
+
+    def parse(self, response):
+        n = int(response.url.rsplit("/", 1)[1]) + 1
+        if n < self.total:
+            yield Request(f"http://bench.local/{n}", callback=self.parse)
+
+
+async def _run(spidercls, total, concurrency):
+    spidercls.total = total
+    settings = Settings({
+        "DOWNLOADER": "benchmarks.engine_scheduling.NullDownloader",
+        "CONCURRENCY": concurrency,
+        "CONCURRENCY_PER_DOMAIN": concurrency,
+        "LOG_LEVEL": "WARNING",
+        "STATS_LOG_INTERVAL": 0
+    })
+    process = CrawlerProcess(settings)
+    start = time.perf_counter()
+    await process.crawl(spidercls)
+    await process.start()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--chain", type=int, default=50, help="requests in the chained (queue drains) scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="save results as JSON")
+    args = parser.parse_args()
+    results = []
+    for spidercls, total in ((FanoutSpider, args.requests), (ChainSpider, args.chain)):
+        elapsed = asyncio.run(_run(spidercls, total, args.concurrency))
+        results.append({
+            "name": spidercls.__name__,
+            "requests": total,
+            "elapsed": elapsed,
+            "us_per_request": elapsed / total * 1e6
+        })
+        print(
+            f"{spidercls.__name__:<14} requests={total:<8} total={elapsed:.3f}s "
+            f"per_request={elapsed / total * 1e6:.1f}us"
+        )
+    if args.output:
+        params = {key: value for key, value in vars(args).items() if key != "output"}
+        save_results(args.output, "engine_scheduling", results, params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+核心组件的微基准测试: Scheduler 入队/出队、Processor 处理 item、Item 读写和 Response.xpath
+    python -m benchmarks.micro --number 20000 --output micro.json
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.results import save_results
+from benchmarks.server import render_page
+from pyler.core.processor import Processor
+from pyler.core.scheduler import Scheduler
+from pyler.crawler import Crawler
+from pyler.httplib.request import Request
+from pyler.httplib.response import Response
+from pyler.item import Field, Item
+from pyler.settings import Settings
+from pyler.spiders import Spider
+
+
+class BenchItem(Item):
+    url = Field()
+    title = Field()
+    price = Field()
+    tags = Field()
+
+
+def _crawler(**settings) -> Crawler:
+    crawler = Crawler(Spider, Settings({"LOG_LEVEL": "WARNING", "STATS_LOG_INTERVAL": 0, **settings}))
+    crawler.spider = crawler._create_spider()
+    crawler.stats = crawler._create_stats()
+    return crawler
+
+
+def _result(name: str, number: int, elapsed: float) -> Dict:
+    return {
+        "name": name,
+        "number": number,
+        "elapsed": elapsed,
+        "ops_per_sec": number / elapsed,
+        "us_per_op": elapsed / number * 1e6
+    }
+
+
+async def bench_scheduler(number: int, **settings) -> float:
+    scheduler = Scheduler.create_instance(_crawler(**settings))
+    requests = [Request(f"http://bench-{i % 64}.local/{i}", priority=i % 8) for i in range(number)]
+    start = time.perf_counter()
+    for request in requests:
+        await scheduler.enqueue_request(request)
+    while await scheduler.next_request() is not None:
+        pass
+    elapsed = time.perf_counter() - start
+    scheduler.close()
+    return elapsed
+
+
+async def bench_processor(number: int) -> float:
+    processor = Processor(_crawler())
+    items = [BenchItem(url=f"http://bench.local/{i}", title="title") for i in range(number)]
+    await processor.open()
+    start = time.perf_counter()
+    await processor.enqueue_many(items)
+    await processor.queue.join()
+    elapsed = time.perf_counter() - start
+    await processor.close()
+    return elapsed
+
+
+def bench_item(number: int) -> float:
+    start = time.perf_counter()
+    for i in range(number):
+        item = BenchItem(url="http://bench.local/", title="title")
+        item["price"] = i
+        item["tags"] = item["title"]
+        item.to_dict()
+    return time.perf_counter() - start
+
+
+def bench_xpath(number: int, size: int = 10_000) -> float:
+    body = render_page(1, 1000, size=size)
+    request = Request("http://bench.local/page/1")
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    start = time.perf_counter()
+    for _ in range(number):
+        # 每次都构造新的 Response, 包含编码检测和解析 HTML 的开销
+        response = Response(request.url, request=request, headers=headers, body=body)
+        response.xpath("//a/@href").getall()
+        response.xpath("//title/text()").get()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="operations per benchmark")
+    parser.add_argument("--xpath-number", type=int, default=2000, help="pages parsed in the xpath benchmark")
+    parser.add_argument("--size", type=int, default=10_000, help="page size in bytes for the xpath benchmark")
+    parser.add_argument("--output", help="save results as JSON")
+    args = parser.parse_args()
+    number = args.number
+    benchmarks: List[tuple[str, int, Callable[[], float]]] = [
+        ("scheduler[memory]", number, lambda: asyncio.run(bench_scheduler(number))),
+        ("scheduler[memory,bloom]", number, lambda: asyncio.run(bench_scheduler(number, DUPEFILTER_MODE="bloom"))),
+        ("scheduler[disk]", number, lambda: asyncio.run(
+            bench_scheduler(number, SCHEDULER_QUEUE="pyler.utils.pqueue.DiskPriorityQueue", SCHEDULER_DISK_HEAD_SIZE=100)
+        )),
+        ("scheduler[roundrobin]", number, lambda: asyncio.run(
+            bench_scheduler(number, SCHEDULER_QUEUE="pyler.utils.pqueue.RoundRobinQueue")
+        )),
+        ("processor", number, lambda: asyncio.run(bench_processor(number))),
+        ("item", number, lambda: bench_item(number)),
+        ("response.xpath", args.xpath_number, lambda: bench_xpath(args.xpath_number, args.size)),
+    ]
+    results = []
+    for name, n, func in benchmarks:
+        result = _result(name, n, func())
+        results.append(result)
+        print(f"{name:<24} {n:>8} ops {result['ops_per_sec']:>12.0f} ops/s {result['us_per_op']:>10.2f} us/op")
+    if args.output:
+        params = {key: value for key, value in vars(args).items() if key != "output"}
+        save_results(args.output, "micro", results, params)
+
+
+if __name__ == "__main__":
+    main()
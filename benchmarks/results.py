@@ -0,0 +1,80 @@
+"""
+基准测试结果的保存和对比:
+    python -m benchmarks.results old.json new.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+# 这些指标越大越好，其余指标(耗时、内存)越小越好
+HIGHER_IS_BETTER = ("pages_per_sec", "ops_per_sec")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path: str, suite: str, results: List[Dict], params: Optional[Dict] = None):
+    """保存为 JSON, 每条结果以 name 区分，便于不同版本之间对比"""
+    data = {
+        "suite": suite,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params or {},
+        "results": results
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def compare(old: Dict, new: Dict, threshold: float = 0.1) -> List[str]:
+    """对比两次结果，返回变化超过 threshold 的指标"""
+    lines = []
+    old_results = {result["name"]: result for result in old["results"]}
+    for result in new["results"]:
+        if (previous := old_results.get(result["name"])) is None:
+            continue
+        for key, value in result.items():
+            before = previous.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before
+            if abs(change) < threshold:
+                continue
+            better = change > 0 if key in HIGHER_IS_BETTER else change < 0
+            lines.append(
+                f"{'improved' if better else 'REGRESSED':<10} {result['name']} {key}: "
+                f"{before:.4g} -> {value:.4g} ({change:+.1%})"
+            )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change to report")
+    args = parser.parse_args()
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    lines = compare(old, new, args.threshold)
+    print("\n".join(lines) if lines else "no significant changes")
+    sys.exit(1 if any(line.startswith("REGRESSED") for line in lines) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+基准测试使用的本地 HTTP 服务，生成指定大小、延迟和链接数量的合成页面:
+    python -m benchmarks.server --port 8900 --size 20000 --latency 0.05 --fanout 10
+"""
+import argparse
+import asyncio
+
+from aiohttp import web
+
+
+def render_page(n: int, pages: int, size: int = 10_000, fanout: int = 10) -> bytes:
+    """第 n 个页面，链接指向后续页面，从 0 号页面出发可以访问到全部 pages 个页面"""
+    links = "".join(f'<li><a href="/page/{(n * fanout + i + 1) % pages}">page</a></li>' for i in range(fanout))
+    head = f"<html><head><title>page {n}</title></head><body><ul>{links}</ul>"
+    tail = "</body></html>"
+    # 用段落填充到指定大小
+    filler = "<p>lorem ipsum dolor sit amet</p>" * max(0, (size - len(head) - len(tail)) // 32)
+    return (head + filler + tail).encode("utf-8")
+
+
+class BenchServer:
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 8900,
+            pages: int = 1000,
+            size: int = 10_000,
+            latency: float = 0.,
+            fanout: int = 10
+    ):
+        self.host = host
+        self.port = port
+        self.pages = pages
+        self.size = size
+        self.latency = latency
+        self.fanout = fanout
+        # 页面内容预先生成，避免服务端成为瓶颈
+        self._bodies = [render_page(n, pages, size, fanout) for n in range(pages)]
+        self._runner = None
+
+    @property
+    def start_url(self) -> str:
+        return f"http://{self.host}:{self.port}/page/0"
+
+    async def _page(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        n = int(request.match_info["n"])
+        return web.Response(body=self._bodies[n % self.pages], content_type="text/html", charset="utf-8")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/page/{n}", self._page)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=10_000, help="page size in bytes")
+    parser.add_argument("--latency", type=float, default=0., help="seconds to wait before responding")
+    parser.add_argument("--fanout", type=int, default=10, help="links per page")
+    args = parser.parse_args()
+    server = BenchServer(args.host, args.port, args.pages, args.size, args.latency, args.fanout)
+
+    async def serve():
+        await server.start()
+        print(f"serving {args.pages} pages at {server.start_url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
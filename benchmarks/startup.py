@@ -0,0 +1,148 @@
+"""
+短任务的启动耗时测试: 每次在新的解释器进程中导入 pyler 并抓取一个本地页面, 取多次运行的中位数:
+    python -m benchmarks.startup --repeat 10 --output startup.json
+
+    interpreter_ms     空解释器(python -c pass)的启动耗时, 作为基线
+    import_ms          导入 pyler.crawler 等模块的耗时
+    first_request_ms   从导入开始到第一个请求进入下载器
+    first_response_ms  从导入开始到第一个响应交给回调
+    process_ms         整个进程从启动到退出的耗时
+
+本模块顶层只导入标准库, 避免子进程提前导入 aiohttp 影响测量
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+_STARTED = time.perf_counter()
+
+DOWNLOADERS = {
+    "aiohttp": "pyler.core.downloader.AIOHTTPDownloader",
+    "httpx": "pyler.core.downloader.HTTPXDownloader"
+}
+# 检查哪些较重的依赖被导入了
+HEAVY_MODULES = ("aiohttp", "httpx", "parsel", "lxml")
+
+
+class FirstRequestMiddleware:
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        if self.stats.get_value("startup/first_request") is None:
+            self.stats.set_value("startup/first_request", time.perf_counter())
+        return None
+
+
+def _child(downloader: str, url: str):
+    from pyler.crawler import CrawlerProcess
+    from pyler.httplib.request import Request
+    from pyler.settings import Settings
+    from pyler.spiders import Spider
+    imported = time.perf_counter()
+
+    class StartupSpider(Spider):
+
+        def start_requests(self):
+            yield Request(url, callback=self.parse)
+
+        def parse(self, response):
+            self.crawler.stats.set_value("startup/first_response", time.perf_counter())
+            yield from ()
+
+    process = CrawlerProcess(Settings({
+        "DOWNLOADER": DOWNLOADERS[downloader],
+        "DOWNLOADER_MIDDLEWARES": {"benchmarks.startup.FirstRequestMiddleware": 100},
+        "STATS_LOG_INTERVAL": 0,
+        "STATS_DUMP": False,
+        "LOG_LEVEL": "WARNING"
+    }))
+
+    async def run():
+        await process.crawl(StartupSpider)
+        await process.start()
+
+    asyncio.run(run())
+    stats = next(iter(process.crawlers)).stats
+    print(json.dumps({
+        "import_ms": (imported - _STARTED) * 1000,
+        "first_request_ms": (stats.get_value("startup/first_request", imported) - _STARTED) * 1000,
+        "first_response_ms": (stats.get_value("startup/first_response", imported) - _STARTED) * 1000,
+        "modules": [name for name in HEAVY_MODULES if name in sys.modules]
+    }))
+
+
+async def _spawn(*args: str) -> Tuple[float, bytes]:
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(sys.executable, *args, stdout=asyncio.subprocess.PIPE)
+    stdout, _ = await process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(args)} exited with {process.returncode}")
+    return (time.perf_counter() - start) * 1000, stdout
+
+
+async def _run(args) -> List[Dict]:
+    from benchmarks.server import BenchServer
+    server = BenchServer(args.host, args.port, pages=1, size=1000, fanout=0)
+    await server.start()
+    results = []
+    try:
+        interpreter = statistics.median([(await _spawn("-c", "pass"))[0] for _ in range(args.repeat)])
+        for downloader in args.downloaders:
+            runs = []
+            for _ in range(args.repeat):
+                elapsed, stdout = await _spawn(
+                    "-m", "benchmarks.startup", "--child", downloader, "--url", server.start_url
+                )
+                runs.append({**json.loads(stdout.decode().splitlines()[-1]), "process_ms": elapsed})
+            result = {
+                "name": downloader,
+                "interpreter_ms": interpreter,
+                **{
+                    key: statistics.median(run[key] for run in runs)
+                    for key in ("import_ms", "first_request_ms", "first_response_ms", "process_ms")
+                },
+                "modules": runs[-1]["modules"]
+            }
+            results.append(result)
+            print(
+                f"{downloader:<8} interpreter={interpreter:.1f}ms import={result['import_ms']:.1f}ms "
+                f"first_request={result['first_request_ms']:.1f}ms first_response={result['first_response_ms']:.1f}ms "
+                f"process={result['process_ms']:.1f}ms modules={','.join(result['modules'])}"
+            )
+    finally:
+        await server.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--repeat", type=int, default=10, help="runs per downloader, the median is reported")
+    parser.add_argument("--downloaders", nargs="+", choices=list(DOWNLOADERS), default=list(DOWNLOADERS))
+    parser.add_argument("--child", choices=list(DOWNLOADERS), help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="save results as JSON")
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child, args.url)
+        return
+    results = asyncio.run(_run(args))
+    if args.output:
+        from benchmarks.results import save_results
+        params = {key: value for key, value in vars(args).items() if key not in ("output", "child", "url")}
+        save_results(args.output, "startup", results, params)
+
+
+if __name__ == "__main__":
+    main()
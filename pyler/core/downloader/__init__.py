@@ -0,0 +1,382 @@
+"""
+下载器基类和下载槽调度, 具体的下载后端按需导入:
+    pyler.core.downloader.AIOHTTPDownloader -> pyler.core.downloader.aiohttpdownloader
+    pyler.core.downloader.HTTPXDownloader   -> pyler.core.downloader.httpxdownloader
+只有 DOWNLOADER 配置使用的后端及其依赖(aiohttp/httpx)会被导入
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from importlib import import_module
+from typing import AsyncIterator, Final, Set, Dict, Deque, Optional
+from abc import abstractmethod, ABCMeta
+from urllib.parse import urlsplit
+
+from pyler.core.httpcache import HttpCache
+from pyler.exceptions import DownloadSizeExceeded, IgnoreRequest
+from pyler.httplib.request import Request
+from pyler.httplib.response import Response
+from pyler.middlewares import DownloaderMiddlewareManager
+from pyler.utils.logger import SAMPLED, get_logger
+
+# 兼容原来的导入路径, 首次访问时才导入对应的后端模块
+_LAZY_ATTRS: Final = {
+    "AIOHTTPDownloader": "pyler.core.downloader.aiohttpdownloader",
+    "CachingResolver": "pyler.core.downloader.aiohttpdownloader",
+    "HTTPXDownloader": "pyler.core.downloader.httpxdownloader",
+}
+
+
+def __getattr__(name):
+    if (module := _LAZY_ATTRS.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(module), name)
+
+
+# 清理过期下载槽的间隔(秒)
+_SLOT_SWEEP_INTERVAL: Final = 5.
+
+
+class ActiveRequests:
+
+    def __init__(self):
+        self._active: Final[Set] = set()
+
+    def add(self, request):
+        self._active.add(request)
+
+    def remove(self, request):
+        self._active.remove(request)
+
+    @asynccontextmanager
+    async def __call__(self, request):
+        try:
+            yield self.add(request)
+        finally:
+            self.remove(request)
+
+    def __len__(self):
+        return len(self._active)
+
+
+class Slot:
+    """同一个域名(或 IP)共享的下载槽，控制该域名的并发数和请求间隔"""
+
+    def __init__(self, concurrency: int, delay: float = 0., randomize_delay: bool = True):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.randomize_delay = randomize_delay
+        self.active: int = 0
+        self.next_time: float = 0.
+        self.queue: Final[Deque[Request]] = deque()
+
+    def download_delay(self) -> float:
+        if self.randomize_delay:
+            return random.uniform(0.5 * self.delay, 1.5 * self.delay)
+        return self.delay
+
+    def ready(self, now: float) -> bool:
+        return self.active < self.concurrency and now >= self.next_time
+
+    def acquire(self, now: float):
+        self.active += 1
+        if self.delay:
+            self.next_time = now + self.download_delay()
+
+    def release(self):
+        self.active -= 1
+
+    def idle(self, now: float) -> bool:
+        return self.active == 0 and not self.queue and now >= self.next_time
+
+    def __repr__(self):
+        return f"<Slot concurrency={self.concurrency} delay={self.delay} active={self.active} queued={len(self.queue)}>"
+
+
+class DownloaderMeta(ABCMeta):
+
+    def __subclasscheck__(self, subclass):
+        methods = ("fetch", "download", "create_instance", "close", "idle")
+        return all(
+            hasattr(subclass, method) and callable(getattr(subclass, method, None)) for method in methods
+        )
+
+
+class Downloader(metaclass=DownloaderMeta):
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self._active = ActiveRequests()
+        self.logger = get_logger(self.__class__.__name__, self.crawler.settings.get("LOG_LEVEL"))
+        self.stats = crawler.stats
+        self.slots: Final[Dict[str, Slot]] = {}
+        # 有请求在排队的 slot, 按加入顺序轮流出队
+        self._waiting: Final[Dict[str, Slot]] = {}
+        # 调度器因下载间隔未到而跳过的 slot, 引擎按它们的到期时间设置唤醒定时器
+        self._throttled: Final[Dict[str, Slot]] = {}
+        # 已经下载、还没有经过中间件 process_response 的流式响应
+        self._streams: Final[Dict[Request, Response]] = {}
+        # 所有 slot 中排队的请求数, 达到 DOWNLOAD_SLOT_BACKLOG 后引擎不再从调度器取请求
+        self.backlog: int = 0
+        self._max_backlog: int = 100
+        self._next_sweep: float = 0.
+        self._ip_cache: Final[Dict[str, str]] = {}
+        self._slot_concurrency: int = 8
+        self._slot_by_ip: bool = False
+        self._delay: float = 0.
+        self._randomize_delay: bool = True
+        self._maxsize: int = 0
+        self._warnsize: int = 0
+        self.httpcache: Optional[HttpCache] = None
+        self.middleware: Optional[DownloaderMiddlewareManager] = None
+        # 启用 AUTOTHROTTLE_ENABLED 时由引擎设置
+        self.throttle = None
+
+    @classmethod
+    def create_instance(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+    def open(self):
+        self.logger.info(
+            f"{self.crawler.spider} using downloader: {type(self).__name__} "
+            f"concurrency: {self.crawler.settings.getint('CONCURRENCY')}"
+        )
+        settings = self.crawler.settings
+        ip_concurrency = settings.getint("CONCURRENCY_PER_IP")
+        self._slot_by_ip = ip_concurrency > 0
+        self._slot_concurrency = ip_concurrency or settings.getint("CONCURRENCY_PER_DOMAIN", 8)
+        self._delay = settings.getfloat("DOWNLOAD_DELAY")
+        self._randomize_delay = settings.getbool("RANDOMIZE_DOWNLOAD_DELAY", True)
+        self._max_backlog = max(1, settings.getint("DOWNLOAD_SLOT_BACKLOG", 100))
+        self._maxsize = settings.getint("DOWNLOAD_MAXSIZE")
+        self._warnsize = settings.getint("DOWNLOAD_WARNSIZE")
+        if settings.getbool("HTTPCACHE_ENABLED"):
+            self.httpcache = HttpCache.create_instance(self.crawler)
+        self.middleware = DownloaderMiddlewareManager.create_instance(self.crawler)
+
+    async def close(self):
+        if self.httpcache is not None:
+            self.httpcache.close()
+
+    def check_size(self, request: Request, expected_size: Optional[int]):
+        """根据 Content-Length 提前放弃超过 DOWNLOAD_MAXSIZE 的下载"""
+        if expected_size is None:
+            return
+        maxsize = request.meta.get("download_maxsize", self._maxsize)
+        warnsize = request.meta.get("download_warnsize", self._warnsize)
+        if maxsize and expected_size > maxsize:
+            raise DownloadSizeExceeded(f"{request} expected size {expected_size} larger than maxsize {maxsize}")
+        if warnsize and expected_size > warnsize:
+            self.logger.warning(f"{request} expected size {expected_size} larger than warnsize {warnsize}")
+
+    async def iter_body(self, request: Request, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """按块读取响应体，实际大小超过 DOWNLOAD_MAXSIZE 时中止"""
+        maxsize = request.meta.get("download_maxsize", self._maxsize)
+        warnsize = request.meta.get("download_warnsize", self._warnsize)
+        received, warned = 0, False
+        async for chunk in chunks:
+            received += len(chunk)
+            if maxsize and received > maxsize:
+                raise DownloadSizeExceeded(f"{request} received {received} bytes larger than maxsize {maxsize}")
+            if warnsize and received > warnsize and not warned:
+                warned = True
+                self.logger.warning(f"{request} received {received} bytes larger than warnsize {warnsize}")
+            yield chunk
+        self.stats.inc_value("downloader/response_bytes", received)
+
+    async def read_body(self, request: Request, chunks: AsyncIterator[bytes]) -> bytes:
+        """读取完整响应体; 设置了 meta["download_path"] 时直接写入文件并返回空 body"""
+        if path := request.meta.get("download_path"):
+            await self._write_body(path, self.iter_body(request, chunks))
+            return b""
+        return b"".join([chunk async for chunk in self.iter_body(request, chunks)])
+
+    @staticmethod
+    async def _write_body(path: str, chunks: AsyncIterator[bytes]):
+        """在线程池中打开和写入文件，不阻塞事件循环; 写入一块的同时读取下一块，最多只有一块在写"""
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, open, path, "wb")
+        writing: Optional[asyncio.Future] = None
+        try:
+            async for chunk in chunks:
+                if writing is not None:
+                    await writing
+                writing = loop.run_in_executor(None, f.write, chunk)
+            if writing is not None:
+                await writing
+        finally:
+            if writing is not None and not writing.done():
+                await asyncio.wait([writing])
+            await loop.run_in_executor(None, f.close)
+
+    @staticmethod
+    def streaming(request: Request) -> bool:
+        return bool(request.meta.get("download_stream"))
+
+    async def get_slot_key(self, request: Request) -> str:
+        if (key := request.meta.get("download_slot")) is not None:
+            return key
+        host = urlsplit(request.url).hostname or ""
+        if not self._slot_by_ip:
+            return host
+        if (ip := self._ip_cache.get(host)) is None:
+            try:
+                infos = await asyncio.get_running_loop().getaddrinfo(host, None)
+                ip = infos[0][4][0]
+            except OSError:
+                ip = host
+            self._ip_cache[host] = ip
+        return ip
+
+    def _get_slot(self, key: str, request: Request) -> Slot:
+        if (slot := self.slots.get(key)) is None:
+            meta = request.meta
+            slot = self.slots[key] = Slot(
+                concurrency=meta.get("download_concurrency", self._slot_concurrency),
+                delay=meta.get("download_delay", self._delay),
+                randomize_delay=self._randomize_delay
+            )
+        return slot
+
+    async def acquire(self, request: Request) -> bool:
+        """为请求占用所属 slot, slot 已满时请求在 slot 中排队并返回 False"""
+        if self.httpcache is not None and self.httpcache.lookup(request):
+            # 新鲜的缓存不经过网络，也不占用下载槽
+            return True
+        key = request.meta["download_slot"] = await self.get_slot_key(request)
+        slot = self._get_slot(key, request)
+        now = time.monotonic()
+        if slot.queue or not slot.ready(now):
+            slot.queue.append(request)
+            self.backlog += 1
+            self._waiting[key] = slot
+            return False
+        slot.acquire(now)
+        return True
+
+    def next_deferred(self) -> Optional[Request]:
+        """从已经空闲的 slot 中取出一个排队的请求并占用该 slot"""
+        if not self._waiting:
+            return None
+        now = time.monotonic()
+        for key, slot in self._waiting.items():
+            if slot.ready(now):
+                request = slot.queue.popleft()
+                self.backlog -= 1
+                slot.acquire(now)
+                del self._waiting[key]
+                if slot.queue:
+                    # 移到末尾，让其他域名的请求轮流出队
+                    self._waiting[key] = slot
+                return request
+        return None
+
+    def backlog_full(self) -> bool:
+        """slot 中排队的请求已达上限, 剩余的请求留在调度器(磁盘/远程队列)中"""
+        return self.backlog >= self._max_backlog
+
+    def slot_busy(self, key: str) -> bool:
+        """slot 已经占满、还有请求在排队或者下载间隔未到, 调度器可以先取其他域名的请求"""
+        if (slot := self.slots.get(key)) is None:
+            return False
+        if slot.active >= slot.concurrency or slot.queue:
+            return True
+        if time.monotonic() < slot.next_time:
+            self._throttled[key] = slot
+            return True
+        return False
+
+    def next_ready_time(self) -> Optional[float]:
+        """排队中或者被调度器跳过的 slot 中仅因下载间隔而等待的 slot 最早可下载的时间"""
+        ready_time = min(
+            (slot.next_time for slot in self._waiting.values() if slot.active < slot.concurrency), default=None
+        )
+        if self._throttled:
+            # 到期后调度器会重新检查，仍在等待的 slot 会再次被记录
+            throttled = min(slot.next_time for slot in self._throttled.values())
+            self._throttled.clear()
+            ready_time = throttled if ready_time is None else min(ready_time, throttled)
+        return ready_time
+
+    def release(self, request: Request):
+        key = request.meta["download_slot"]
+        slot = self.slots[key]
+        slot.release()
+        now = time.monotonic()
+        if slot.idle(now):
+            del self.slots[key]
+        if now >= self._next_sweep:
+            self._sweep_slots(now)
+
+    def _sweep_slots(self, now: float):
+        """释放时还在下载间隔内的 slot 不能立即删除, 定期删除之后一直没有再使用的 slot"""
+        self._next_sweep = now + _SLOT_SWEEP_INTERVAL
+        for key in [key for key, slot in self.slots.items() if slot.idle(now)]:
+            del self.slots[key]
+
+    async def fetch(self, request) -> Optional[Response]:
+        """经过下载器中间件下载请求，失败、被丢弃或重新调度时返回 None"""
+        cached = self.httpcache.fresh_response(request) if self.httpcache is not None else None
+        result = None
+        try:
+            if cached is not None:
+                # 新鲜的缓存不占用下载槽，但和下载到的响应一样经过中间件的 process_response
+                result = await self.middleware.process_response(request, cached)
+            else:
+                async with self._active(request):
+                    result = await self.middleware.download(self._download, request)
+                if self.httpcache is not None and isinstance(result, Response):
+                    self.httpcache.store(request)
+        except IgnoreRequest as exc:
+            self.logger.debug("ignored %s: %s", request, exc, extra=SAMPLED)
+            return None
+        except Exception as exc:
+            self.logger.error(f"download {request} error: {exc!r}")
+            return None
+        finally:
+            if cached is None:
+                self.release(request)
+            if self.httpcache is not None:
+                self.httpcache.discard(request)
+            # 被中间件丢弃、替换或重新调度的流式响应不会交给回调，在这里释放连接
+            if (stream := self._streams.pop(request, None)) is not None and stream is not result:
+                await stream.close()
+        if isinstance(result, Request):
+            await self.crawler.engine.enqueue_request(result)
+            return None
+        return result
+
+    async def _download(self, request: Request) -> Response:
+        stats = self.stats
+        stats.inc_value("downloader/request_count")
+        if self.httpcache is not None:
+            self.httpcache.prepare(request)
+        start = time.monotonic()
+        try:
+            response = await self.download(request)
+        except Exception as exc:
+            stats.inc_value("downloader/exception_count")
+            stats.inc_value(f"downloader/exception_type_count/{type(exc).__name__}")
+            raise
+        stats.observe("downloader/latency_seconds", time.monotonic() - start)
+        if response.stream is not None:
+            self._streams[request] = response
+        stats.inc_value("downloader/response_count")
+        stats.inc_value(f"downloader/response_status_count/{response.status}")
+        if self.throttle is not None:
+            self.throttle.response_received(response.status)
+        if self.httpcache is not None:
+            response = self.httpcache.process_response(request, response)
+        return response
+
+    @abstractmethod
+    async def download(self, request: Request) -> Response:
+        """下载请求并返回 Response, 失败时直接抛出异常，由下载器中间件处理"""
+
+    def idle(self) -> bool:
+        return len(self) == 0 and not self._waiting
+
+    def __len__(self) -> int:
+        return len(self._active)
@@ -0,0 +1,175 @@
+import asyncio
+import socket
+import time
+from typing import Dict, Final, List, Optional, Tuple
+
+from aiohttp import (
+    ClientSession, TCPConnector, BaseConnector, ClientTimeout, ClientResponse, TraceConfig, CookieJar, DummyCookieJar
+)
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+from pyler.core.downloader import Downloader
+from pyler.httplib.response import Response
+from pyler.utils import load_instance
+from pyler.utils.logger import SAMPLED
+
+
+class CachingResolver(AbstractResolver):
+    """进程内的 DNS 缓存: 解析结果按 TTL 缓存，同一主机的并发解析只发出一次查询"""
+
+    def __init__(self, ttl: float = 300., resolver: Optional[AbstractResolver] = None):
+        self.ttl = ttl
+        self._resolver = resolver if resolver is not None else DefaultResolver()
+        self._cache: Final[Dict[Tuple, Tuple[float, List[Dict]]]] = {}
+        self._pending: Final[Dict[Tuple, asyncio.Future]] = {}
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Dict]:
+        key = (host, port, family)
+        if (entry := self._cache.get(key)) is not None and entry[0] > time.monotonic():
+            return entry[1]
+        if (pending := self._pending.get(key)) is not None:
+            return await asyncio.shield(pending)
+        pending = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._resolver.resolve(host, port, family)
+        except BaseException as exc:
+            pending.set_exception(exc)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            pending.exception()
+            raise
+        else:
+            if self.ttl > 0:
+                self._cache[key] = (time.monotonic() + self.ttl, result)
+            pending.set_result(result)
+            return result
+        finally:
+            del self._pending[key]
+
+    async def close(self):
+        self._cache.clear()
+        await self._resolver.close()
+
+
+class AIOHTTPDownloader(Downloader):
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self.session: Optional[ClientSession] = None
+        self.connector: Optional[BaseConnector] = None
+        self.resolver: Optional[AbstractResolver] = None
+        # meta["cookiejar"] -> 共享连接池但 cookie 相互隔离的 session
+        self._sessions: Final[Dict] = {}
+        self._cookies_enabled: bool = True
+        self._timeout: Optional[ClientTimeout] = None
+        self.trace_config: Optional[TraceConfig] = None
+
+    def open(self):
+        super().open()
+        settings = self.crawler.settings
+        self._cookies_enabled = settings.getbool("COOKIES_ENABLED", True)
+        if settings.getbool("NEW_SESSION"):
+            self.logger.warning(
+                "NEW_SESSION is deprecated and no longer drops the connection pool, "
+                "cookies are disabled instead; use COOKIES_ENABLED = False or meta['cookiejar']"
+            )
+            self._cookies_enabled = False
+        self._timeout = ClientTimeout(total=settings.getint("DOWNLOAD_TIMEOUT"))
+        self.trace_config = TraceConfig()
+        self.trace_config.on_request_start.append(self.request_start)
+        self.trace_config.on_connection_create_end.append(self.connection_create_end)
+        self.trace_config.on_connection_reuseconn.append(self.connection_reuseconn)
+        dns_ttl = settings.getfloat("DNS_CACHE_TTL")
+        if resolver_cls := settings.get("DNS_RESOLVER"):
+            self.resolver = load_instance(resolver_cls)(ttl=dns_ttl)
+        self.connector = TCPConnector(
+            ssl=settings.getbool("VERIFY_SSL"),
+            limit=settings.getint("CONNECTION_LIMIT"),
+            limit_per_host=settings.getint("CONNECTION_LIMIT_PER_HOST"),
+            keepalive_timeout=settings.getfloat("KEEPALIVE_EXPIRY") or None,
+            resolver=self.resolver,
+            # 使用自定义 resolver 时由它负责缓存
+            use_dns_cache=self.resolver is None and dns_ttl > 0,
+            ttl_dns_cache=int(dns_ttl) or None
+        )
+        self.session = self._create_session()
+
+    def _create_session(self) -> ClientSession:
+        # unsafe=True: 和浏览器一样接受 IP 地址形式的主机设置的 cookie
+        cookie_jar = CookieJar(unsafe=True) if self._cookies_enabled else DummyCookieJar()
+        return ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            cookie_jar=cookie_jar,
+            timeout=self._timeout,
+            trace_configs=[self.trace_config]
+        )
+
+    def _get_session(self, request) -> ClientSession:
+        if (key := request.meta.get("cookiejar")) is None:
+            return self.session
+        if (session := self._sessions.get(key)) is None:
+            session = self._sessions[key] = self._create_session()
+        return session
+
+    async def download(self, request) -> Response:
+        response = await self.send(self._get_session(request), request)
+        return await self._read(request, response, stream=self.streaming(request))
+
+    async def _read(self, request, response: ClientResponse, stream: bool) -> Response:
+        try:
+            self.check_size(request, response.content_length)
+            if stream:
+                async def release():
+                    response.release()
+                chunks = self.iter_body(request, response.content.iter_any())
+                return self.make(request, response, b"", stream=chunks, release=release)
+            body = await self.read_body(request, response.content.iter_any())
+        except BaseException:
+            response.close()
+            raise
+        response.release()
+        return self.make(request, response, body)
+
+    @staticmethod
+    def make(request, response, body, **kwargs):
+        return Response(
+            url=str(response.url),
+            body=body,
+            request=request,
+            headers=dict(response.headers),
+            status=response.status,
+            **kwargs
+        )
+
+    @staticmethod
+    async def send(session, request) -> ClientResponse:
+        response = await session.request(
+            request.method,
+            request.url,
+            data=request.body,
+            headers=request.headers,
+            cookies=request.cookies,
+            proxy=request.proxy
+        )
+        return response
+
+    async def request_start(self, _session, _trace_config_ctx, params):
+        self.logger.debug("request downloading: %s, method: %s", params.url, params.method, extra=SAMPLED)
+
+    async def connection_create_end(self, _session, _trace_config_ctx, _params):
+        self.stats.inc_value("downloader/connection_created")
+
+    async def connection_reuseconn(self, _session, _trace_config_ctx, _params):
+        self.stats.inc_value("downloader/connection_reused")
+
+    async def close(self):
+        sessions = [self.session, *self._sessions.values()] if self.session else list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.close()
+        if self.connector:
+            await self.connector.close()
+        if self.resolver:
+            await self.resolver.close()
+        await super().close()
@@ -0,0 +1,87 @@
+from typing import Dict, Final, Optional
+
+import httpx
+
+from pyler.core.downloader import Downloader
+from pyler.httplib.response import Response
+from pyler.utils.logger import SAMPLED
+
+
+class HTTPXDownloader(Downloader):
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self._clients: Final[Dict] = {}
+        self._timeout: Optional[httpx.Timeout] = None
+        self._limits: Optional[httpx.Limits] = None
+        self._http2: bool = False
+        self._verify_ssl: bool = False
+
+    def open(self):
+        super().open()
+        settings = self.crawler.settings
+        self._timeout = httpx.Timeout(timeout=settings.getint("DOWNLOAD_TIMEOUT"))
+        self._limits = httpx.Limits(
+            max_connections=settings.getint("CONNECTION_LIMIT") or None,
+            max_keepalive_connections=settings.getint("KEEPALIVE_CONNECTIONS") or None,
+            keepalive_expiry=settings.getfloat("KEEPALIVE_EXPIRY") or None
+        )
+        self._http2 = settings.getbool("HTTP2_ENABLED")
+        self._verify_ssl = settings.getbool("VERIFY_SSL")
+        self._clients[None] = self._create_client(None)
+
+    def _create_client(self, proxy) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=self._timeout, limits=self._limits, http2=self._http2, verify=self._verify_ssl, proxies=proxy
+        )
+
+    def _get_client(self, proxy) -> httpx.AsyncClient:
+        # httpx 的代理绑定在 client 上，每个代理复用一个长连接 client
+        key = tuple(sorted(proxy.items())) if isinstance(proxy, dict) else proxy
+        if (client := self._clients.get(key)) is None:
+            client = self._clients[key] = self._create_client(proxy)
+        return client
+
+    async def download(self, request) -> Response:
+        client = self._get_client(request.proxy)
+        self.logger.debug("request downloading: %s, method: %s", request.url, request.method, extra=SAMPLED)
+        response = await client.send(
+            client.build_request(
+                request.method,
+                request.url,
+                headers=request.headers,
+                cookies=request.cookies,
+                data=request.body
+            ),
+            stream=True
+        )
+        try:
+            content_length = response.headers.get("content-length")
+            self.check_size(request, int(content_length) if content_length else None)
+            if self.streaming(request):
+                chunks = self.iter_body(request, response.aiter_bytes())
+                return self.make(request, response, b"", stream=chunks, release=response.aclose)
+            body = await self.read_body(request, response.aiter_bytes())
+        except BaseException:
+            await response.aclose()
+            raise
+        await response.aclose()
+        return self.make(request, response, body)
+
+    @staticmethod
+    def make(request, response, body, **kwargs):
+        return Response(
+            url=str(response.url),
+            body=body,
+            request=request,
+            headers=dict(response.headers),
+            status=response.status_code,
+            **kwargs
+        )
+
+    async def close(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+        await super().close()
@@ -1,16 +1,22 @@
 import asyncio
-from typing import Callable, Optional
+import heapq
+import itertools
+import time
+from typing import Callable, Final, List, Optional, Tuple
 from inspect import iscoroutine, isgenerator, isasyncgen
 
 from pyler.core.downloader import Downloader
+from pyler.core.executor import CallbackExecutor
 from pyler.core.scheduler import Scheduler
 from pyler.core.processor import Processor
+from pyler.core.shard import ShardRouter
+from pyler.core.throttle import AutoThrottle
 from pyler.spiders import Spider
 from pyler.httplib.request import Request
 from pyler.taskmanager import TaskManager
 from pyler.item import Item
 from pyler.utils.logger import get_logger
-from pyler.utils import load_instance
+from pyler.utils import as_async_iterator, load_instance
 
 
 class Engine:
@@ -25,20 +31,58 @@ class Engine:
         self.processor: Optional[Processor] = None
         self.scheduler: Optional[Scheduler] = None
         self.task_manager: Optional[TaskManager] = None
+        self.executor: Optional[CallbackExecutor] = None
+        self.router: Optional[ShardRouter] = None
+        self.throttle: Optional[AutoThrottle] = None
+        self.stats = None
+        # 入队、任务完成、下载槽可用时唤醒引擎
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._wakeup_timer: Optional[asyncio.TimerHandle] = None
+        self._output_batch_size: int = 100
+        # 等待重新调度的请求 (到期时间, 序号, 请求)，等待期间不占用并发
+        self._delayed: Final[List[Tuple[float, int, Request]]] = []
+        self._delayed_counter = itertools.count()
+        # 后台读取 start_requests 的任务，调度器中的请求低于水位线时才继续读取
+        self._seeder: Optional[asyncio.Task] = None
+        self._seed_wakeup: asyncio.Event = asyncio.Event()
+        self._start_requests_low_water: int = 1
 
     async def start(self, spider: Spider):
         self.running = True
         self.logger.info(f"Starting spider {spider}")
         self.spider = spider
+        self.stats = self.crawler.stats
         downloader_cls = self._get_downloader()
         self.downloader = downloader_cls.create_instance(self.crawler)
         if hasattr(self.downloader, "open"):
             self.downloader.open()
-        self.scheduler = Scheduler()
-        self.processor = Processor(self.crawler)
-        self.task_manager = TaskManager(maxconcurrency=self.settings.getint('CONCURRENCY'))
+        self.scheduler = Scheduler.create_instance(self.crawler)
+        self.processor = Processor(self.crawler, done_callback=self._wakeup.set)
+        self.executor = CallbackExecutor.create_instance(self.crawler)
+        await self.processor.open()
+        self.task_manager = TaskManager(
+            maxconcurrency=self.settings.getint('CONCURRENCY'), done_callback=self._wakeup.set
+        )
+        if self.settings.getint("SHARD_COUNT") > 1:
+            self.router = ShardRouter.create_instance(self.crawler, wakeup=self._wakeup.set)
+            await self.router.open()
+        self._register_gauges()
+        await self.stats.open()
+        if self.settings.getbool("AUTOTHROTTLE_ENABLED"):
+            self.throttle = AutoThrottle.create_instance(self.crawler, wakeup=self._wakeup.set)
+            self.throttle.open()
+            self.downloader.throttle = self.throttle
         await self._open_spider()
 
+    def _register_gauges(self):
+        # 瞬时值只在输出统计时读取，不增加每个请求的开销
+        self.stats.register_gauge("scheduler/queued", lambda: len(self.scheduler))
+        self.stats.register_gauge("processor/queued", lambda: len(self.processor))
+        self.stats.register_gauge("downloader/active", lambda: len(self.downloader))
+        self.stats.register_gauge("downloader/slots", lambda: len(self.downloader.slots))
+        self.stats.register_gauge("downloader/slot_backlog", lambda: self.downloader.backlog)
+        self.stats.register_gauge("engine/tasks", lambda: len(self.task_manager))
+
     def _get_downloader(self):
         downloader_cls = load_instance(self.settings.get('DOWNLOADER'))
         if not issubclass(downloader_cls, Downloader):
@@ -51,49 +95,146 @@ class Engine:
         await task
 
     async def crawl(self):
-        start_requests = iter(self.spider.start_requests())
+        self._start_requests_low_water = max(1, self.settings.getint("START_REQUESTS_LOW_WATER", 100))
+        self._seeder = asyncio.create_task(self._consume_start_requests())
         while self.running:
-            if (request := await self.next_request()) is not None:
-                await self._crawl(request)
-            else:
-                try:
-                    start_request = next(start_requests)
-                except StopIteration:
-                    start_requests = None
-                except Exception as e:
-                    if await self._close_spider():
-                        self.running = False
-                    if start_requests is not None:
-                        self.logger.error(f"start_requests is not empty, error: {e}")
+            self._wakeup.clear()
+            await self._enqueue_delayed()
+            while not self.task_manager.full():
+                if (request := self.downloader.next_deferred()) is not None:
+                    self._crawl(request)
+                elif self.downloader.backlog_full():
+                    # 下载槽中排队的请求已达上限，等槽空出后再从调度器取，避免磁盘/远程队列被搬进内存
+                    break
+                elif (request := await self.next_request()) is not None:
+                    # 所属域名的下载槽已满时，请求在槽中排队，不占用全局并发
+                    if await self.downloader.acquire(request):
+                        self._crawl(request)
                 else:
-                    await self.enqueue_request(start_request)
-        if not self.running:
-            await self.close()
+                    break
+            if self._queued() < self._start_requests_low_water:
+                self._seed_wakeup.set()
+            if self.router is not None and self.router.aborted:
+                # 其他分片异常退出，不再等待本地请求完成
+                self.running = False
+                break
+            idle = self._seeder.done() and self._spider_idle()
+            if self.router is not None:
+                # 分片空闲时不能直接结束，其他分片可能还会转发请求过来，由主进程统一通知结束
+                self.router.update(idle)
+                idle = idle and self.router.stopped
+            if idle:
+                self.running = False
+                break
+            self._schedule_timer_wakeup()
+            await self._wakeup.wait()
+        await self.close()
+
+    async def _consume_start_requests(self):
+        """
+        读取同步或异步的 start_requests, 调度器中的请求达到水位线后暂停，
+        等引擎把请求取走后再继续，海量种子不会一次性进入内存
+        """
+        low_water = self._start_requests_low_water
+        try:
+            async for request in as_async_iterator(self.spider.start_requests()):
+                if self._queued() >= low_water:
+                    self._seed_wakeup.clear()
+                    await self._seed_wakeup.wait()
+                # 多进程模式下每个分片只保留属于自己的种子请求
+                if self.router is None or self.router.owns(request):
+                    await self.enqueue_request(request)
+                # 种子被大量过滤时调度器长度不增长，主动让出事件循环
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.logger.error(f"error while reading {self.spider}.start_requests, stop reading seeds: {exc!r}")
+        finally:
+            self._wakeup.set()
+
+    def _queued(self) -> int:
+        """调度器和下载槽中等待下载的请求数"""
+        return len(self.scheduler) + self.downloader.backlog
+
+    def _schedule_timer_wakeup(self):
+        """排队的下载槽还在等待下载间隔，或有延迟调度的请求时，到期后唤醒引擎"""
+        if self._wakeup_timer is not None:
+            self._wakeup_timer.cancel()
+            self._wakeup_timer = None
+        # 并发已满时即使下载槽到期也取不出请求，任务完成时会唤醒引擎
+        ready_time = None if self.task_manager.full() else self.downloader.next_ready_time()
+        if self._delayed and (ready_time is None or self._delayed[0][0] < ready_time):
+            ready_time = self._delayed[0][0]
+        if ready_time is not None:
+            # 并发未满时到期的下载槽或延迟请求在下一轮就会被取走，立即唤醒不会空转
+            self._wakeup_timer = asyncio.get_running_loop().call_later(
+                max(0., ready_time - time.monotonic()), self._wakeup.set
+            )
 
-    async def _crawl(self, request):
+    def wakeup(self):
+        """供调度器队列等外部组件在有新请求可取时唤醒引擎"""
+        self._wakeup.set()
+
+    def schedule_later(self, request: Request, delay: float):
+        """delay 秒后把请求放回调度器，用于重试退避等场景"""
+        heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._delayed_counter), request))
+        self._wakeup.set()
+
+    async def _enqueue_delayed(self):
+        delayed = self._delayed
+        now = time.monotonic()
+        while delayed and delayed[0][0] <= now:
+            await self.enqueue_request(heapq.heappop(delayed)[2])
+
+    def _crawl(self, request):
         async def create_task():
-            outputs = await self.fetch(request)
-            if outputs is not None:
-                await self._handle_spider_output(outputs)
-        # 使用 semaphore 实现并发
-        await self.task_manager.semaphore.acquire()
+            response = await self.downloader.fetch(request)
+            if response is None:
+                return
+            start = time.monotonic()
+            try:
+                outputs = await self.process_response(request, response)
+                if outputs is not None:
+                    await self._handle_spider_output(outputs, request)
+            finally:
+                # 包含遍历回调产出的时间
+                self.stats.observe("spider/callback_seconds", time.monotonic() - start)
+                # 流式响应在回调处理完之后才释放连接
+                await response.close()
         self.task_manager.create_task(create_task())
 
-    async def _handle_spider_output(self, outputs): # noqa
+    async def _handle_spider_output(self, outputs, request: Request): # noqa
+        batch = []
+        # 种子请求的深度为 0, 回调产出的请求比所属响应的请求深一层
+        depth = request.meta.get("depth", 0) + 1
         async for output in outputs:
-            if isinstance(output, (Request, Item)):
-                await self.processor.enqueue(output)
-            else:
+            if isinstance(output, Request):
+                output.meta.setdefault("depth", depth)
+            elif not isinstance(output, Item):
                 raise TypeError(f"{type(self.spider)} must return Request or Item")
+            batch.append(output)
+            if len(batch) >= self._output_batch_size:
+                await self.processor.enqueue_many(batch)
+                batch = []
+        if batch:
+            await self.processor.enqueue_many(batch)
 
     async def enqueue_request(self, request: Request):
-        await self.scheduler.enqueue_request(request)
+        if self.router is not None and not self.router.owns(request):
+            self.router.forward(request)
+            return
+        if await self.scheduler.enqueue_request(request):
+            self.stats.inc_value("scheduler/enqueued")
+            self._wakeup.set()
+        else:
+            self.stats.inc_value("dupefilter/filtered")
 
     async def next_request(self):
         request = await self.scheduler.next_request()
         return request
 
-    async def fetch(self, request):
+    async def process_response(self, request, response):
 
         async def _transform(_outputs):
             if isgenerator(_outputs):
@@ -107,23 +248,34 @@ class Engine:
 
         async def _success(_response):
             callback: Callable = request.callback or self.spider.parse
+            if self.executor.offloaded(request, callback):
+                # 回调在线程池/进程池中执行完毕，产出结果已经收集为列表
+                _outputs = await self.executor.run(request, _response, callback)
+                return _transform(output for output in _outputs)
             if _outputs := callback(_response):
                 if iscoroutine(_outputs):
                     await _outputs
                 else:
                     return _transform(_outputs)
 
-        response = await self.downloader.fetch(request)
-        if response is None:
-            return None
         outputs = await _success(response)
         return outputs
 
-    async def _close_spider(self) -> bool:
-        if all((self.scheduler.idle(), self.downloader.idle(),
-                self.task_manager.all_done(), self.processor.idle(), self.spider)):
-            return True
-        return False
+    def _spider_idle(self) -> bool:
+        return all((not self._delayed, self.scheduler.idle(), self.downloader.idle(), self.task_manager.all_done(),
+                    self.processor.idle(), self.router is None or self.router.idle()))
 
     async def close(self):
+        if self._wakeup_timer is not None:
+            self._wakeup_timer.cancel()
+        if self._seeder is not None and not self._seeder.done():
+            self._seeder.cancel()
+        if self.throttle is not None:
+            self.throttle.close()
+        await self.processor.close()
+        if self.router is not None:
+            await self.router.close()
+        await self.executor.close()
+        self.scheduler.close()
         await self.downloader.close()
+        await self.stats.close()
@@ -0,0 +1,108 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from inspect import isasyncgenfunction, iscoroutinefunction
+from typing import Callable, Dict, List, Optional
+
+from pyler.httplib.request import Request
+from pyler.httplib.response import Response
+from pyler.utils.logger import get_logger
+from pyler.utils.request import callback_name, request_to_dict, request_from_dict
+
+
+def offload(func: Callable) -> Callable:
+    """标记回调在 PARSE_EXECUTOR 指定的线程池或进程池中执行"""
+    func._offload = True
+    return func
+
+
+def _run_callback(callback: Callable, response: Response) -> List:
+    return list(callback(response) or ())
+
+
+# 进程池中每个爬虫类只实例化一次, 注意它与主进程中的爬虫实例不共享状态
+_spiders: Dict[type, object] = {}
+
+
+def _run_callback_in_process(spidercls, name: str, state: dict) -> List:
+    if (spider := _spiders.get(spidercls)) is None:
+        spider = _spiders[spidercls] = spidercls.create_instance(None)
+    response = Response(
+        state["url"],
+        request=request_from_dict(state["request"], spider),
+        headers=state["headers"],
+        body=state["body"],
+        status=state["status"]
+    )
+    return [
+        (True, request_to_dict(output, spider)) if isinstance(output, Request) else (False, output)
+        for output in _run_callback(getattr(spider, name), response)
+    ]
+
+
+class CallbackExecutor:
+
+    def __init__(self, crawler, kind: Optional[str] = None, workers: int = 0):
+        self.crawler = crawler
+        self.kind = (kind or "none").lower()
+        if self.kind not in ("none", "thread", "process"):
+            raise ValueError(f"PARSE_EXECUTOR support value are None, 'thread' or 'process', but got {kind!r}")
+        self.workers = workers or os.cpu_count() or 1
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+        self._executor: Optional[Executor] = None
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(
+            crawler,
+            kind=crawler.settings.get("PARSE_EXECUTOR"),
+            workers=crawler.settings.getint("PARSE_EXECUTOR_WORKERS")
+        )
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="pyler-parse")
+            else:
+                # spawn 避免 fork 一个正在运行事件循环和线程的进程
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def offloaded(self, request: Request, callback: Callable) -> bool:
+        """回调是否需要放到线程池/进程池中执行"""
+        if self.kind == "none":
+            return False
+        if not (getattr(callback, "_offload", False) or request.meta.get("offload")):
+            return False
+        if isasyncgenfunction(callback) or iscoroutinefunction(callback):
+            self.logger.warning(f"async callback {callback.__name__} can not be offloaded, run in event loop")
+            return False
+        return True
+
+    async def run(self, request: Request, response: Response, callback: Callable) -> List:
+        loop = asyncio.get_running_loop()
+        if self.kind == "thread":
+            return await loop.run_in_executor(self.executor, _run_callback, callback, response)
+        spider = self.crawler.spider
+        state = {
+            "url": response.url,
+            "headers": response.headers,
+            "body": response.body,
+            "status": response.status,
+            "request": request_to_dict(request, spider)
+        }
+        outputs = await loop.run_in_executor(
+            self.executor, _run_callback_in_process, type(spider), callback_name(callback, spider), state
+        )
+        return [request_from_dict(output, spider) if is_request else output for is_request, output in outputs]
+
+    async def close(self):
+        """等待正在执行的回调结束，等待在默认线程池中进行，不阻塞事件循环"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, partial(executor.shutdown, wait=True, cancel_futures=True)
+            )
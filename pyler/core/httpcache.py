@@ -0,0 +1,301 @@
+import os
+import pickle
+import struct
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Final, Optional, Tuple
+
+from pyler.httplib.request import Request
+from pyler.httplib.response import Response
+from pyler.utils import load_instance
+from pyler.utils.logger import get_logger
+from pyler.utils.request import request_fingerprint
+
+
+def _parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _, arg = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class DiskCacheStorage:
+    """
+    追加写入的单文件缓存，每条记录为:
+        头部(指纹, 存入时间, 元数据长度, body 长度) + pickle 的 (url, status, headers) + body
+    索引常驻内存，打开时扫描头部重建; 同一请求再次写入时旧记录成为垃圾，关闭时按比例压缩
+    """
+
+    _HEADER: Final = struct.Struct("<16sdII")
+
+    def __init__(self, directory: str, expiration: float = 0., log_level: Optional[str] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "cache.dat")
+        self.expiration = expiration
+        self.logger = get_logger(self.__class__.__name__, log_level)
+        # 指纹 -> (记录偏移, 存入时间, 元数据长度, body 长度)
+        self._index: Final[Dict[bytes, Tuple[int, float, int, int]]] = {}
+        self._garbage: int = 0
+        self._fd: int = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._size: int = self._load()
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+        directory = os.path.join(settings.get("HTTPCACHE_DIR", ".httpcache"), str(crawler.spider))
+        if settings.getint("SHARD_COUNT") > 1:
+            # 多进程模式下每个分片写自己的缓存文件, 索引和偏移量只由一个进程维护;
+            # 请求按域名分片, 工作进程数不变时同一个请求总是落在同一个分片的缓存中
+            directory = os.path.join(directory, f"shard-{settings.getint('SHARD_INDEX')}-of-{settings.getint('SHARD_COUNT')}")
+        return cls(
+            directory,
+            expiration=settings.getfloat("HTTPCACHE_EXPIRATION_SECS"),
+            log_level=settings.get("LOG_LEVEL")
+        )
+
+    def _load(self) -> int:
+        header = self._HEADER
+        size = os.fstat(self._fd).st_size
+        offset = 0
+        while offset + header.size <= size:
+            fingerprint, stored, meta_length, body_length = header.unpack(os.pread(self._fd, header.size, offset))
+            end = offset + header.size + meta_length + body_length
+            if end > size:
+                break
+            if fingerprint in self._index:
+                self._garbage += 1
+            self._index[fingerprint] = (offset, stored, meta_length, body_length)
+            offset = end
+        if offset < size:
+            # 上次写入中途退出留下的不完整记录
+            self.logger.warning(f"truncating incomplete cache record at {offset} in {self.path}")
+            os.truncate(self.path, offset)
+        return offset
+
+    def retrieve(self, request: Request, fingerprint: bytes) -> Optional[Response]:
+        if (entry := self._index.get(fingerprint)) is None:
+            return None
+        offset, stored, meta_length, body_length = entry
+        if self.expiration and time.time() - stored > self.expiration:
+            return None
+        offset += self._HEADER.size
+        url, status, headers = pickle.loads(os.pread(self._fd, meta_length, offset))
+        # body 直接从文件读成 bytes, 不再额外复制
+        body = os.pread(self._fd, body_length, offset + meta_length) if body_length else b""
+        return Response(url, request=request, headers=headers, body=body, status=status)
+
+    def store(self, fingerprint: bytes, response: Response):
+        meta = pickle.dumps((response.url, response.status, response.headers), protocol=pickle.HIGHEST_PROTOCOL)
+        stored = time.time()
+        header = self._HEADER.pack(fingerprint, stored, len(meta), len(response.body))
+        os.writev(self._fd, (header, meta, response.body))
+        if fingerprint in self._index:
+            self._garbage += 1
+        self._index[fingerprint] = (self._size, stored, len(meta), len(response.body))
+        self._size += len(header) + len(meta) + len(response.body)
+
+    def stored_time(self, fingerprint: bytes) -> Optional[float]:
+        entry = self._index.get(fingerprint)
+        return entry[1] if entry is not None else None
+
+    def _compact(self):
+        path = self.path + ".compact"
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            for offset, _stored, meta_length, body_length in sorted(self._index.values()):
+                os.write(fd, os.pread(self._fd, self._HEADER.size + meta_length + body_length, offset))
+        finally:
+            os.close(fd)
+        os.replace(path, self.path)
+
+    def close(self):
+        if self._fd < 0:
+            return
+        try:
+            if self._garbage > len(self._index):
+                self._compact()
+        finally:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __len__(self):
+        return len(self._index)
+
+
+class DummyPolicy:
+    """缓存所有响应，命中后永不过期也不重新验证，适合开发时反复运行爬虫"""
+
+    def __init__(self, ignore_http_codes=()):
+        self.ignore_http_codes = set(ignore_http_codes)
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(crawler.settings.get("HTTPCACHE_IGNORE_HTTP_CODES") or ())
+
+    def should_cache_request(self, request: Request) -> bool:
+        return True
+
+    def should_cache_response(self, response: Response) -> bool:
+        return response.status not in self.ignore_http_codes
+
+    def is_fresh(self, cached: Response, request: Request, stored: float) -> bool:
+        return True
+
+    def conditional_headers(self, cached: Response) -> Dict[str, str]:
+        return {}
+
+
+class RFCPolicy(DummyPolicy):
+    """
+    近似 RFC 7234 的缓存策略: 根据 Cache-Control/Expires/Last-Modified 判断是否新鲜，
+    过期后带上 If-None-Match/If-Modified-Since 重新验证，服务端返回 304 时继续使用缓存
+    """
+
+    _CACHEABLE_METHODS: Final = {"GET", "HEAD"}
+
+    def should_cache_request(self, request: Request) -> bool:
+        if request.method.upper() not in self._CACHEABLE_METHODS:
+            return False
+        return "no-store" not in _parse_cache_control((request.headers or {}).get("Cache-Control"))
+
+    def should_cache_response(self, response: Response) -> bool:
+        if not super().should_cache_response(response):
+            return False
+        return "no-store" not in _parse_cache_control(response.header("Cache-Control"))
+
+    @staticmethod
+    def _freshness_lifetime(cached: Response, directives: Dict) -> float:
+        if (max_age := directives.get("max-age")) is not None:
+            try:
+                return max(0, int(max_age))
+            except ValueError:
+                return 0
+        date = _parse_http_date(cached.header("Date"))
+        if (expires := _parse_http_date(cached.header("Expires"))) is not None:
+            return max(0., expires - (date or expires))
+        if date is not None and (last_modified := _parse_http_date(cached.header("Last-Modified"))) is not None:
+            # 启发式过期时间: 距离上次修改时间的 10%
+            return max(0., (date - last_modified) / 10)
+        return 0
+
+    def is_fresh(self, cached: Response, request: Request, stored: float) -> bool:
+        request_directives = _parse_cache_control((request.headers or {}).get("Cache-Control"))
+        if "no-cache" in request_directives or request_directives.get("max-age") == "0":
+            return False
+        directives = _parse_cache_control(cached.header("Cache-Control"))
+        if "no-cache" in directives:
+            return False
+        try:
+            age = int(cached.header("Age") or 0)
+        except ValueError:
+            age = 0
+        return time.time() - stored + age < self._freshness_lifetime(cached, directives)
+
+    def conditional_headers(self, cached: Response) -> Dict[str, str]:
+        headers = {}
+        if etag := cached.header("ETag"):
+            headers["If-None-Match"] = etag
+        if last_modified := cached.header("Last-Modified"):
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    包在 Downloader.fetch 外层的 HTTP 缓存:
+    新鲜的缓存在占用下载槽之前就直接返回，完全不经过网络;
+    过期的缓存带上条件请求头重新下载，收到 304 时返回缓存内容;
+    下载到的响应经过所有中间件的 process_response 之后才写入，被重试或丢弃的响应不会进入缓存
+    """
+
+    def __init__(self, crawler, storage, policy):
+        self.crawler = crawler
+        self.storage = storage
+        self.policy = policy
+        self.stats = crawler.stats
+        # acquire 时查到的缓存，fetch 时取出，避免重复读磁盘
+        self._fresh: Final[Dict[Request, Response]] = {}
+        self._stale: Final[Dict[Request, Tuple[bytes, Response]]] = {}
+        # 下载到但还没有经过中间件 process_response 的响应
+        self._pending: Final[Dict[Request, Tuple[bytes, Response]]] = {}
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+        storage = load_instance(settings.get("HTTPCACHE_STORAGE")).create_instance(crawler)
+        policy = load_instance(settings.get("HTTPCACHE_POLICY")).create_instance(crawler)
+        return cls(crawler, storage, policy)
+
+    def _cacheable(self, request: Request) -> bool:
+        meta = request.meta
+        if meta.get("dont_cache") or meta.get("download_stream") or meta.get("download_path"):
+            return False
+        return self.policy.should_cache_request(request)
+
+    def lookup(self, request: Request) -> bool:
+        """查询缓存，命中且新鲜时返回 True, 调用方可以跳过下载槽"""
+        if not self._cacheable(request):
+            return False
+        fingerprint = request_fingerprint(request)
+        if (cached := self.storage.retrieve(request, fingerprint)) is None:
+            self.stats.inc_value("httpcache/miss")
+            return False
+        if self.policy.is_fresh(cached, request, self.storage.stored_time(fingerprint)):
+            self._fresh[request] = cached
+            return True
+        self._stale[request] = (fingerprint, cached)
+        return False
+
+    def fresh_response(self, request: Request) -> Optional[Response]:
+        if (response := self._fresh.pop(request, None)) is not None:
+            self.stats.inc_value("httpcache/hit")
+        return response
+
+    def prepare(self, request: Request):
+        """过期的缓存需要重新验证时，给请求加上条件请求头"""
+        if (entry := self._stale.get(request)) is not None:
+            if headers := self.policy.conditional_headers(entry[1]):
+                request.headers = {**(request.headers or {}), **headers}
+
+    def process_response(self, request: Request, response: Optional[Response]) -> Optional[Response]:
+        entry = self._stale.pop(request, None)
+        if response is None or not self._cacheable(request):
+            return response
+        fingerprint = entry[0] if entry is not None else request_fingerprint(request)
+        if response.status == 304 and entry is not None:
+            self.stats.inc_value("httpcache/revalidate")
+            cached = entry[1]
+            # 304 中的头部覆盖缓存中的同名头部，重新计算新鲜度
+            cached.headers.update(response.headers)
+            self._pending[request] = (fingerprint, cached)
+            return cached
+        if self.policy.should_cache_response(response):
+            if response.header("Date") is None:
+                response.headers["Date"] = formatdate(usegmt=True)
+            self._pending[request] = (fingerprint, response)
+        return response
+
+    def store(self, request: Request):
+        """中间件都接受了响应后写入缓存"""
+        if (entry := self._pending.pop(request, None)) is not None:
+            self.stats.inc_value("httpcache/store")
+            self.storage.store(*entry)
+
+    def discard(self, request: Request):
+        self._fresh.pop(request, None)
+        self._stale.pop(request, None)
+        self._pending.pop(request, None)
+
+    def close(self):
+        self.storage.close()
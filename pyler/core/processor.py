@@ -1,34 +1,90 @@
 import asyncio
-from typing import Union
+from typing import Callable, Final, Iterable, Optional, Set, Union
 
 from pyler.httplib.request import Request
 from pyler.item import Item
+from pyler.pipelines import ItemPipelineManager
+from pyler.utils.logger import SAMPLED, get_logger
 
 
 class Processor:
 
-    def __init__(self, crawler):
-        self.queue: asyncio.Queue = asyncio.Queue()
+    def __init__(self, crawler, done_callback: Optional[Callable[[], None]] = None):
         self.crawler = crawler
+        settings = crawler.settings
+        # 有界队列: 消费跟不上时 enqueue 会等待，从而减慢回调的产出速度
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.getint("PROCESSOR_QUEUE_SIZE", 1000))
+        self.concurrency: int = max(1, settings.getint("PROCESSOR_CONCURRENCY", 4))
+        # 多进程模式下 item 汇总到主进程的 pipeline 中处理，工作进程不加载 pipeline
+        self._aggregate_items: bool = (
+            settings.getint("SHARD_COUNT") > 1 and settings.getbool("SHARD_AGGREGATE_ITEMS", True)
+        )
+        if self._aggregate_items:
+            self.pipelines = ItemPipelineManager(crawler, [])
+        else:
+            self.pipelines = ItemPipelineManager.create_instance(crawler)
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+        self._consumers: Final[Set[asyncio.Task]] = set()
+        self._processing: int = 0
+        self._done_callback = done_callback
 
-    async def process(self):
-        while not self.idle():
+    async def open(self):
+        await self.pipelines.open_spider()
+        for _ in range(self.concurrency):
+            self._consumers.add(asyncio.create_task(self._consume()))
+
+    async def close(self):
+        await self.queue.join()
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers.clear()
+        await self.pipelines.close_spider()
+
+    async def _consume(self):
+        while True:
             result = await self.queue.get()
-            if isinstance(result, Request):
-                await self.crawler.engine.enqueue_request(result)
-            else:
-                assert isinstance(result, Item)
-                await self.process_item(result)
+            self._processing += 1
+            try:
+                await self.process(result)
+            except Exception as exc:
+                self.logger.error(f"process {result!r} error: {exc!r}")
+            finally:
+                self._processing -= 1
+                self.queue.task_done()
+            if self._done_callback is not None and self.idle():
+                self._done_callback()
+
+    async def process(self, result: Union[Request, Item]):
+        if isinstance(result, Request):
+            await self.crawler.engine.enqueue_request(result)
+        else:
+            assert isinstance(result, Item)
+            await self.process_item(result)
 
     async def process_item(self, item):
-        print(item)
+        self.logger.debug("scraped item: %r", item, extra=SAMPLED)
+        if self._aggregate_items:
+            # 由主进程统计
+            self.crawler.engine.router.send_item(item)
+            return
+        self.crawler.stats.inc_value("item_scraped_count")
+        await self.pipelines.process_item(item)
 
     async def enqueue(self, output: Union[Request, Item]):
         await self.queue.put(output)
-        await self.process()
+
+    async def enqueue_many(self, outputs: Iterable[Union[Request, Item]]):
+        """批量入队，只有队列满时才需要等待"""
+        queue = self.queue
+        for output in outputs:
+            if queue.full():
+                await queue.put(output)
+            else:
+                queue.put_nowait(output)
 
     def idle(self) -> bool:
-        return len(self) == 0
+        return len(self) == 0 and self._processing == 0
 
     def __len__(self):
         return self.queue.qsize()
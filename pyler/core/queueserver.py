@@ -0,0 +1,109 @@
+"""
+供同一台机器上多个爬虫进程共享的请求队列和去重服务:
+    python -m pyler.core.queueserver --host 127.0.0.1 --port 6380
+
+客户端为 pyler.utils.pqueue.RemoteQueue, 请求在客户端序列化，服务端只保存字节串
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+from typing import Final, List, Optional, Tuple, Union
+
+from pyler.utils.dupefilters import BloomFilter, DigestSet
+from pyler.utils.logger import get_logger
+from pyler.utils.wire import read_message, write_message
+
+
+class QueueServer:
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 6380,
+            dupefilter_mode: Optional[str] = "set",
+            capacity: int = 10_000_000,
+            error_rate: float = 0.001
+    ):
+        self.host = host
+        self.port = port
+        self.logger = get_logger(self.__class__.__name__)
+        # 堆中元素为 (排序键, 序号, 序列化后的请求)，排序键相同时先进先出
+        self._heap: Final[List[Tuple[Tuple[int, ...], int, bytes]]] = []
+        self._counter = itertools.count()
+        if dupefilter_mode == "bloom":
+            self.fingerprints = BloomFilter(capacity, error_rate)
+        elif dupefilter_mode == "set":
+            self.fingerprints = DigestSet(width=16)
+        else:
+            self.fingerprints = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.logger.info(f"queue server listening on {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    def push(self, batch: List[Tuple[Optional[bytes], Union[int, Tuple[int, ...]], bytes]]) -> int:
+        """批量入队, 指纹已存在的请求被丢弃, 返回实际入队数量; 排序键可以是优先级或 (优先级, 深度)"""
+        accepted = 0
+        for fingerprint, key, data in batch:
+            if fingerprint is not None and self.fingerprints is not None and not self.fingerprints.add(fingerprint):
+                continue
+            if not isinstance(key, tuple):
+                key = key,
+            heapq.heappush(self._heap, (key, next(self._counter), data))
+            accepted += 1
+        return accepted
+
+    def pop(self, n: int) -> List[bytes]:
+        heap = self._heap
+        return [heapq.heappop(heap)[2] for _ in range(min(n, len(heap)))]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                message = await read_message(reader)
+                if message[0] == "push":
+                    write_message(writer, ("ok", self.push(message[1]), len(self)))
+                elif message[0] == "pop":
+                    write_message(writer, ("ok", self.pop(message[1]), len(self)))
+                elif message[0] == "size":
+                    write_message(writer, ("ok", len(self)))
+                else:
+                    write_message(writer, ("error", f"unknown command {message[0]!r}"))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pyler shared request queue server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    parser.add_argument("--dupefilter-mode", choices=("set", "bloom", "none"), default="set")
+    parser.add_argument("--capacity", type=int, default=10_000_000, help="bloom filter capacity")
+    parser.add_argument("--error-rate", type=float, default=0.001, help="bloom filter false positive rate")
+    args = parser.parse_args()
+    server = QueueServer(args.host, args.port, args.dupefilter_mode, args.capacity, args.error_rate)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
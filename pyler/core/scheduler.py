@@ -2,21 +2,38 @@ from typing import Optional
 
 from pyler.httplib.request import Request
 from pyler.utils.pqueue import PriorityQueue
+from pyler.utils import load_instance
 
 
 class Scheduler:
 
-    def __init__(self) -> None:
-        self.pq: PriorityQueue = PriorityQueue()
+    def __init__(self, queue=None, dupefilter=None) -> None:
+        self.pq = queue if queue is not None else PriorityQueue()
+        self.dupefilter = dupefilter
+
+    @classmethod
+    def create_instance(cls, crawler):
+        queue = load_instance(crawler.settings.get("SCHEDULER_QUEUE")).create_instance(crawler)
+        dupefilter = None
+        if dupefilter_cls := crawler.settings.get("DUPEFILTER"):
+            dupefilter = load_instance(dupefilter_cls).create_instance(crawler)
+        return cls(queue=queue, dupefilter=dupefilter)
 
     async def next_request(self) -> Optional[Request]:
         """获取下一个 Request 对象"""
         return await self.pq.get()
 
-    async def enqueue_request(self, request: Request) -> None:
-        """将 Request 对象放入优先级队列"""
-        # todo 实现去重
+    async def enqueue_request(self, request: Request) -> bool:
+        """将 Request 对象放入优先级队列，重复的请求会被丢弃"""
+        if not request.dont_filter and self.dupefilter is not None and self.dupefilter.request_seen(request):
+            return False
         await self.pq.put(request)
+        return True
+
+    def close(self):
+        self.pq.close()
+        if self.dupefilter is not None:
+            self.dupefilter.close()
 
     def idle(self) -> bool:
         """调度器是否处于空闲状态"""
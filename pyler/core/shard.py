@@ -0,0 +1,388 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, Final, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from pyler.httplib.request import Request
+from pyler.item import Item
+from pyler.utils.logger import configure_logging, get_logger
+from pyler.utils.request import request_to_dict, request_from_dict
+from pyler.utils.wire import read_message, write_message
+
+
+# 转发失败后重试的间隔(秒)
+_RETRY_DELAY: Final = 1.
+
+
+def shard_for(request: Request, count: int) -> int:
+    """按域名哈希决定请求属于哪个分片"""
+    host = urlsplit(request.url).hostname or ""
+    return zlib.crc32(host.encode("utf-8")) % count
+
+
+def _socket_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.sock")
+
+
+class ShardRouter:
+    """
+    工作进程中负责分片通信的组件:
+    把不属于本分片的请求批量转发给所属进程，把 item 批量发送给主进程，
+    并向主进程汇报空闲状态和收发计数，用于判断整个爬取是否结束
+    """
+
+    def __init__(self, crawler, index: int, count: int, directory: str, wakeup: Callable[[], None]):
+        self.crawler = crawler
+        settings = crawler.settings
+        self.index = index
+        self.count = count
+        self.directory = directory
+        self.batch_size: int = settings.getint("SHARD_BATCH_SIZE", 500)
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+        self.stopped: bool = False
+        # 有分片异常退出时由主进程通知，引擎不再等待本地请求完成
+        self.aborted: bool = False
+        self.sent: int = 0
+        self.received: int = 0
+        self._wakeup = wakeup
+        self._idle: bool = False
+        self._reported: Optional[Tuple] = None
+        self._buffers: Final[Dict[int, List[dict]]] = defaultdict(list)
+        self._items: List[Item] = []
+        self._connections: Final[Dict[int, asyncio.Task]] = {}
+        self._sending: Final[Set[asyncio.Task]] = set()
+        self._handlers: Final[Set[asyncio.Task]] = set()
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._coordinator: Optional[asyncio.StreamWriter] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._started: asyncio.Event = asyncio.Event()
+
+    @classmethod
+    def create_instance(cls, crawler, wakeup: Callable[[], None]):
+        settings = crawler.settings
+        return cls(
+            crawler,
+            index=settings.getint("SHARD_INDEX"),
+            count=settings.getint("SHARD_COUNT"),
+            directory=settings.get("SHARD_SOCKET_DIR"),
+            wakeup=wakeup
+        )
+
+    async def open(self):
+        self._server = await asyncio.start_unix_server(
+            self._handle_peer, path=_socket_path(self.directory, f"shard-{self.index}")
+        )
+        reader, self._coordinator = await asyncio.open_unix_connection(_socket_path(self.directory, "coordinator"))
+        self._listener = asyncio.create_task(self._listen_coordinator(reader))
+        write_message(self._coordinator, ("ready", self.index))
+        # 等所有分片都启动后再开始爬取，保证转发时对方已经在监听
+        await self._started.wait()
+
+    def owns(self, request: Request) -> bool:
+        return shard_for(request, self.count) == self.index
+
+    def forward(self, request: Request):
+        if self.aborted:
+            return
+        shard = shard_for(request, self.count)
+        buffer = self._buffers[shard]
+        buffer.append(request_to_dict(request, self.crawler.spider))
+        self._idle = False
+        if len(buffer) >= self.batch_size:
+            self._flush()
+        else:
+            self._schedule_flush()
+
+    def send_item(self, item: Item):
+        self._items.append(item)
+        if len(self._items) >= self.batch_size:
+            self._flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        # 同一轮事件循环中产生的请求/item 合并为一次发送
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for shard, batch in self._buffers.items():
+            if batch:
+                self._send(self._send_peer(shard, batch))
+        self._buffers.clear()
+        if self._items:
+            items, self._items = self._items, []
+            write_message(self._coordinator, ("items", items))
+            self._send(self._coordinator.drain())
+
+    def _send(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._sending.add(task)
+        task.add_done_callback(self._sent)
+
+    def _sent(self, task: asyncio.Task):
+        self._sending.discard(task)
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            self.logger.error(f"shard {self.index} send error: {exc!r}")
+        self._wakeup()
+
+    async def _send_peer(self, shard: int, batch: List[dict]):
+        if (connection := self._connections.get(shard)) is None:
+            connection = self._connections[shard] = asyncio.create_task(
+                asyncio.open_unix_connection(_socket_path(self.directory, f"shard-{shard}"))
+            )
+        try:
+            _reader, writer = await connection
+            write_message(writer, ("requests", batch))
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError) as exc:
+            self._close_connection(shard)
+            if self.aborted:
+                return
+            # 放回缓冲区稍后重发, 发送成功前本分片不会进入空闲, 收发计数也不会少算
+            self._buffers[shard][:0] = batch
+            self.logger.warning(
+                f"shard {self.index} send {len(batch)} requests to shard {shard} error: {exc!r}, "
+                f"retry in {_RETRY_DELAY}s"
+            )
+            if self._retry_handle is None:
+                self._retry_handle = asyncio.get_running_loop().call_later(_RETRY_DELAY, self._retry)
+            return
+        self.sent += len(batch)
+
+    def _retry(self):
+        self._retry_handle = None
+        self._flush()
+
+    def _close_connection(self, shard: int):
+        """断开的连接下次发送时重新建立"""
+        if (connection := self._connections.pop(shard, None)) is None or not connection.done():
+            return
+        if not connection.cancelled() and connection.exception() is None:
+            connection.result()[1].close()
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        spider = self.crawler.spider
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                _kind, batch = await read_message(reader)
+                # 先标记为非空闲，避免在请求入队前回复主进程的探测
+                self._idle = False
+                for d in batch:
+                    await self.crawler.engine.enqueue_request(request_from_dict(d, spider))
+                self.received += len(batch)
+                self._wakeup()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _listen_coordinator(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                message = await read_message(reader)
+                if message[0] == "start":
+                    self._started.set()
+                elif message[0] == "probe":
+                    self._report(wave=message[1])
+                elif message[0] == "stop":
+                    self.stopped = True
+                    self._wakeup()
+                elif message[0] == "abort":
+                    self._abort()
+        except asyncio.IncompleteReadError:
+            self.stopped = True
+            self._wakeup()
+
+    def _abort(self):
+        """其他分片异常退出，丢弃还没有发出的请求并尽快结束"""
+        self.aborted = self.stopped = True
+        if dropped := sum(len(batch) for batch in self._buffers.values()):
+            self.logger.warning(f"shard {self.index} aborted, dropped {dropped} requests for other shards")
+        self._buffers.clear()
+        # 还没有开始爬取时也不再等待 start
+        self._started.set()
+        self._wakeup()
+
+    def _report(self, wave: Optional[int] = None):
+        status = (self._idle, self.sent, self.received)
+        if wave is None and status == self._reported:
+            return
+        self._reported = status
+        write_message(self._coordinator, ("status", self.index, *status, wave))
+
+    def update(self, idle: bool):
+        """引擎每次等待前汇报本地是否空闲"""
+        self._idle = idle
+        self._report()
+
+    def idle(self) -> bool:
+        return not self._sending and not any(self._buffers.values()) and not self._items
+
+    async def close(self):
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+        self._flush()
+        while self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+        for connection in self._connections.values():
+            if connection.done() and not connection.exception():
+                connection.result()[1].close()
+        if self._handlers:
+            # 其他分片关闭连接后这里的读取会正常结束
+            await asyncio.wait(self._handlers, timeout=5)
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._coordinator is not None:
+            self._coordinator.close()
+        if self._server is not None:
+            self._server.close()
+
+
+def _run_shard(spidercls, settings):
+    from pyler.crawler import Crawler
+    asyncio.run(Crawler(spidercls, settings).crawl())
+
+
+class ShardCoordinator:
+    """
+    主进程中的协调者: 启动 N 个各自运行引擎的工作进程，
+    汇总它们产出的 item，并在所有分片都空闲且没有在途请求时通知结束
+    """
+
+    def __init__(self, crawler, workers: int):
+        self.crawler = crawler
+        self.workers = workers
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+        self._writers: Final[Dict[int, asyncio.StreamWriter]] = {}
+        self._status: Final[Dict[int, Tuple[bool, int, int]]] = {}
+        self._handlers: Final[Set[asyncio.Task]] = set()
+        self._wave: int = 0
+        self._wave_totals: Optional[Tuple[int, int]] = None
+        self._wave_replies: Final[Dict[int, Tuple[bool, int, int]]] = {}
+        self._stopped: bool = False
+        self._aborted: bool = False
+        self.pipelines = None
+
+    async def run(self):
+        from pyler.pipelines import ItemPipelineManager
+
+        spider = self.crawler.spider = self.crawler._create_spider()
+        configure_logging(self.crawler.settings)
+        # 主进程只统计汇总过来的 item, 各工作进程有自己的统计
+        stats = self.crawler.stats = self.crawler._create_stats()
+        settings = self.crawler.settings
+        directory = settings.get("SHARD_SOCKET_DIR") or tempfile.mkdtemp(prefix="pyler-shard-")
+        server = await asyncio.start_unix_server(self._handle_worker, path=_socket_path(directory, "coordinator"))
+        if settings.getbool("SHARD_AGGREGATE_ITEMS", True):
+            self.pipelines = ItemPipelineManager.create_instance(self.crawler)
+            await self.pipelines.open_spider()
+        self.logger.info(f"Starting spider {spider} in {self.workers} processes")
+        context = multiprocessing.get_context("spawn")
+        processes = []
+        for index in range(self.workers):
+            shard_settings = settings.copy()
+            shard_settings.update({"SHARD_INDEX": index, "SHARD_COUNT": self.workers, "SHARD_SOCKET_DIR": directory})
+            process = context.Process(target=_run_shard, args=(self.crawler.spidercls, shard_settings))
+            process.start()
+            processes.append(process)
+        loop = asyncio.get_running_loop()
+        try:
+            joins = {loop.run_in_executor(None, process.join): index for index, process in enumerate(processes)}
+            while joins:
+                done, _pending = await asyncio.wait(joins, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    index = joins.pop(future)
+                    if not self._stopped:
+                        # 异常退出的分片不会再收发请求，其他分片的计数永远对不上，只能整体结束
+                        self._abort(index, processes[index].exitcode)
+            while self._handlers:
+                await asyncio.gather(*self._handlers, return_exceptions=True)
+        finally:
+            server.close()
+            if self.pipelines is not None:
+                await self.pipelines.close_spider()
+            await stats.close()
+            if not settings.get("SHARD_SOCKET_DIR"):
+                shutil.rmtree(directory, ignore_errors=True)
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                message = await read_message(reader)
+                if message[0] == "items":
+                    self.crawler.stats.inc_value("item_scraped_count", len(message[1]))
+                    for item in message[1]:
+                        await self.pipelines.process_item(item)
+                elif message[0] == "status":
+                    _kind, index, idle, sent, received, wave = message
+                    self._on_status(index, (idle, sent, received), wave)
+                elif message[0] == "ready":
+                    self._writers[message[1]] = writer
+                    if self._aborted:
+                        write_message(writer, ("abort",))
+                    elif len(self._writers) == self.workers:
+                        self._broadcast(("start",))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    def _abort(self, index: int, exitcode: Optional[int]):
+        self.logger.error(f"shard {index} exited with code {exitcode} before the crawl finished, aborting other shards")
+        self._stopped = self._aborted = True
+        self._writers.pop(index, None)
+        self._broadcast(("abort",))
+
+    def _broadcast(self, message: Tuple):
+        for writer in self._writers.values():
+            write_message(writer, message)
+
+    @staticmethod
+    def _totals(statuses) -> Tuple[bool, int, int]:
+        return (
+            all(idle for idle, _, _ in statuses),
+            sum(sent for _, sent, _ in statuses),
+            sum(received for _, _, received in statuses)
+        )
+
+    def _on_status(self, index: int, status: Tuple[bool, int, int], wave: Optional[int]):
+        self._status[index] = status
+        if wave is not None:
+            if wave != self._wave or self._wave_totals is None:
+                return
+            self._wave_replies[index] = status
+            if len(self._wave_replies) < self.workers:
+                return
+            # 两轮统计结果一致且收发相等，说明没有在途请求，可以结束
+            idle, sent, received = self._totals(self._wave_replies.values())
+            if idle and sent == received and (sent, received) == self._wave_totals:
+                self._stopped = True
+                self._broadcast(("stop",))
+                return
+            self._wave_totals = None
+        if self._wave_totals is not None or len(self._status) < self.workers:
+            return
+        idle, sent, received = self._totals(self._status.values())
+        if idle and sent == received:
+            self._wave += 1
+            self._wave_totals = (sent, received)
+            self._wave_replies.clear()
+            self._broadcast(("probe", self._wave))
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Final, List, Optional, Sequence
+
+from pyler.utils.logger import get_logger
+
+
+# 默认的直方图分桶上界(秒)，覆盖从毫秒级解析到分钟级下载
+DEFAULT_BUCKETS: Final = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+
+
+class Histogram:
+    """固定分桶的直方图，记录一次只需要一次二分查找和两次加法"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        # 最后一个桶对应 +Inf
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """按分桶估算分位数，返回所在桶的上界"""
+        if not self.count:
+            return 0.
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts))
+        }
+
+
+class StatsCollector:
+    """
+    爬虫运行状态统计: 计数器和数值保存在 dict 中，耗时保存在直方图中，
+    队列长度等瞬时值注册为 gauge 回调，只在读取统计时才计算
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        settings = crawler.settings
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+        self.log_interval: float = settings.getfloat("STATS_LOG_INTERVAL", 60.)
+        self.dump: bool = settings.getbool("STATS_DUMP", True)
+        self.metrics_host: str = settings.get("METRICS_HOST", "127.0.0.1")
+        self.metrics_port: int = settings.getint("METRICS_PORT")
+        if self.metrics_port and settings.getint("SHARD_COUNT") > 1:
+            # 多进程模式下每个工作进程使用各自的端口
+            self.metrics_port += settings.getint("SHARD_INDEX")
+        self._stats: Final[Dict] = {}
+        self._histograms: Final[Dict[str, Histogram]] = {}
+        self._gauges: Final[Dict[str, Callable[[], float]]] = {}
+        self._log_task: Optional[asyncio.Task] = None
+        self._runner = None
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(crawler)
+
+    def get_value(self, key: str, default=None):
+        return self._stats.get(key, default)
+
+    def set_value(self, key: str, value):
+        self._stats[key] = value
+
+    def inc_value(self, key: str, count: int = 1, start: int = 0):
+        stats = self._stats
+        stats[key] = stats.get(key, start) + count
+
+    def max_value(self, key: str, value):
+        self._stats[key] = max(self._stats.get(key, value), value)
+
+    def min_value(self, key: str, value):
+        self._stats[key] = min(self._stats.get(key, value), value)
+
+    def observe(self, key: str, value: float):
+        if (histogram := self._histograms.get(key)) is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def register_gauge(self, key: str, func: Callable[[], float]):
+        self._gauges[key] = func
+
+    def get_stats(self) -> dict:
+        stats = dict(self._stats)
+        for key, func in self._gauges.items():
+            try:
+                stats[key] = func()
+            except Exception as exc:
+                self.logger.debug(f"gauge {key} error: {exc!r}")
+        return stats
+
+    def get_histograms(self) -> Dict[str, Histogram]:
+        return dict(self._histograms)
+
+    async def open(self):
+        self.set_value("start_time", time.time())
+        if self.log_interval > 0:
+            self._log_task = asyncio.create_task(self._log_periodically())
+        if self.metrics_port:
+            await self._start_server()
+
+    async def close(self):
+        finish_time = time.time()
+        self.set_value("finish_time", finish_time)
+        if (start_time := self.get_value("start_time")) is not None:
+            self.set_value("elapsed_time_seconds", finish_time - start_time)
+        if self._log_task is not None:
+            self._log_task.cancel()
+            self._log_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self.dump:
+            self.logger.info(f"Dumping stats:\n{json.dumps(self.to_dict(), indent=2, default=str)}")
+
+    async def _log_periodically(self):
+        pages = items = 0
+        while True:
+            await asyncio.sleep(self.log_interval)
+            stats = self.get_stats()
+            _pages = stats.get("downloader/response_count", 0)
+            _items = stats.get("item_scraped_count", 0)
+            rate = 60 / self.log_interval
+            latency = self._histograms.get("downloader/latency_seconds")
+            self.logger.info(
+                f"Crawled {_pages} pages (at {(_pages - pages) * rate:.0f} pages/min), "
+                f"scraped {_items} items (at {(_items - items) * rate:.0f} items/min), "
+                f"latency p50/p99: {latency.quantile(.5) if latency else 0}/{latency.quantile(.99) if latency else 0}s, "
+                f"queued: {stats.get('scheduler/queued', 0)}, active: {stats.get('downloader/active', 0)}"
+            )
+            pages, items = _pages, _items
+
+    def to_dict(self) -> dict:
+        stats = self.get_stats()
+        stats.update((key, histogram.to_dict()) for key, histogram in self._histograms.items())
+        return stats
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式，只输出数值类型的统计项"""
+        lines = []
+        for key, value in self.get_stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"{_metric_name(key)} {value}")
+        for key, histogram in self._histograms.items():
+            name = _metric_name(key)
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip([*map(str, histogram.bounds), "+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum {histogram.sum}")
+            lines.append(f"{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    async def _start_server(self):
+        from aiohttp import web
+
+        async def metrics(_request):
+            return web.Response(text=self.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+        async def stats(_request):
+            return web.json_response(self.to_dict(), dumps=lambda obj: json.dumps(obj, default=str))
+
+        app = web.Application()
+        app.router.add_get("/metrics", metrics)
+        app.router.add_get("/stats", stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.metrics_host, self.metrics_port).start()
+        self.logger.info(f"metrics available at http://{self.metrics_host}:{self.metrics_port}/metrics")
+
+
+class DummyStatsCollector(StatsCollector):
+    """不记录任何统计，用于对开销极其敏感的场景"""
+
+    def set_value(self, key: str, value):
+        pass
+
+    def inc_value(self, key: str, count: int = 1, start: int = 0):
+        pass
+
+    def max_value(self, key: str, value):
+        pass
+
+    def min_value(self, key: str, value):
+        pass
+
+    def observe(self, key: str, value: float):
+        pass
+
+    def register_gauge(self, key: str, func: Callable[[], float]):
+        pass
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+_INVALID_METRIC_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _metric_name(key: str) -> str:
+    return "pyler_" + _INVALID_METRIC_CHARS.sub("_", key)
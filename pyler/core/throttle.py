@@ -0,0 +1,134 @@
+import asyncio
+from typing import Callable, Optional, Tuple
+
+from pyler.utils.logger import get_logger
+
+
+class AutoThrottle:
+    """
+    根据最近一个统计窗口内的下载延迟、异常比例和 429/503 响应动态调整全局并发 (TaskManager.maxconcurrency):
+        收到限流响应: 立即把并发乘以 AUTOTHROTTLE_BACKOFF_FACTOR, 每个窗口最多一次
+        异常比例过高: 并发乘以 AUTOTHROTTLE_BACKOFF_FACTOR
+        平均延迟明显高于 AUTOTHROTTLE_TARGET_LATENCY: 按 目标延迟 / 实际延迟 的比例降低, 每次最多减半
+        延迟明显低于目标且并发已被占满: 并发增加 10% (至少 1)
+    并发始终在 AUTOTHROTTLE_MIN_CONCURRENCY 和 AUTOTHROTTLE_MAX_CONCURRENCY 之间
+    """
+
+    # 延迟在目标值上下 10% 以内时不调整，避免并发来回抖动
+    TOLERANCE = 0.1
+
+    def __init__(
+            self,
+            crawler,
+            wakeup: Callable[[], None],
+            min_concurrency: int = 1,
+            max_concurrency: int = 64,
+            target_latency: float = 1.,
+            interval: float = 1.,
+            error_ratio: float = 0.1,
+            backoff_factor: float = 0.5,
+            throttle_codes=(429, 503)
+    ):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.target_latency = target_latency
+        self.interval = interval
+        self.error_ratio = error_ratio
+        self.backoff_factor = backoff_factor
+        self.throttle_codes = frozenset(int(code) for code in throttle_codes)
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+        self._wakeup = wakeup
+        self._last: Tuple[int, int, int, float] = (0, 0, 0, 0.)
+        self._task: Optional[asyncio.Task] = None
+        # 本窗口内是否已经因为限流响应降低过并发
+        self._backed_off: bool = False
+
+    @classmethod
+    def create_instance(cls, crawler, wakeup: Callable[[], None]):
+        settings = crawler.settings
+        return cls(
+            crawler,
+            wakeup,
+            min_concurrency=settings.getint("AUTOTHROTTLE_MIN_CONCURRENCY", 1),
+            max_concurrency=settings.getint("AUTOTHROTTLE_MAX_CONCURRENCY", 64),
+            target_latency=settings.getfloat("AUTOTHROTTLE_TARGET_LATENCY", 1.),
+            interval=settings.getfloat("AUTOTHROTTLE_INTERVAL", 1.),
+            error_ratio=settings.getfloat("AUTOTHROTTLE_ERROR_RATIO", 0.1),
+            backoff_factor=settings.getfloat("AUTOTHROTTLE_BACKOFF_FACTOR", 0.5),
+            throttle_codes=settings.get("AUTOTHROTTLE_THROTTLE_CODES") or ()
+        )
+
+    @property
+    def task_manager(self):
+        return self.crawler.engine.task_manager
+
+    def open(self):
+        task_manager = self.task_manager
+        task_manager.maxconcurrency = min(self.max_concurrency, max(self.min_concurrency, task_manager.maxconcurrency))
+        self.stats.register_gauge("autothrottle/concurrency", lambda: self.task_manager.maxconcurrency)
+        self._last = self._snapshot()
+        self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _snapshot(self) -> Tuple[int, int, int, float]:
+        stats = self.stats
+        latency = stats.get_histograms().get("downloader/latency_seconds")
+        return (
+            stats.get_value("downloader/response_count", 0),
+            stats.get_value("downloader/exception_count", 0),
+            latency.count if latency is not None else 0,
+            latency.sum if latency is not None else 0.
+        )
+
+    def response_received(self, status: int):
+        """由下载器对每个响应调用，限流响应不等统计窗口结束就立即降低并发"""
+        if status in self.throttle_codes and not self._backed_off:
+            self._backed_off = True
+            concurrency = self.task_manager.maxconcurrency
+            self._set(concurrency, int(concurrency * self.backoff_factor), f"throttled, status {status}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.adjust()
+            except Exception as exc:
+                self.logger.error(f"adjust concurrency error: {exc!r}")
+
+    def adjust(self):
+        snapshot = self._snapshot()
+        responses, errors, latency_count, latency_sum = (now - last for now, last in zip(snapshot, self._last))
+        self._last = snapshot
+        backed_off, self._backed_off = self._backed_off, False
+        if backed_off or (not responses and not errors):
+            return
+        latency = latency_sum / latency_count if latency_count else 0.
+        concurrency = self.task_manager.maxconcurrency
+        if errors > self.error_ratio * (responses + errors):
+            new, reason = int(concurrency * self.backoff_factor), "errors"
+        elif latency > self.target_latency * (1 + self.TOLERANCE):
+            new, reason = int(concurrency * max(0.5, self.target_latency / latency)), "slow"
+        elif latency < self.target_latency * (1 - self.TOLERANCE) and self.task_manager.full():
+            # 只有并发确实被占满时才提高并发，引擎有空闲并发时会立即取出新请求
+            new, reason = concurrency + max(1, concurrency // 10), "fast"
+        else:
+            return
+        self._set(
+            concurrency, new,
+            f"{reason}, {responses} responses, {errors} errors, mean latency {latency:.3f}s in last {self.interval:g}s"
+        )
+
+    def _set(self, concurrency: int, new: int, reason: str):
+        new = min(self.max_concurrency, max(self.min_concurrency, new))
+        if new == concurrency:
+            return
+        self.task_manager.maxconcurrency = new
+        self.logger.info(f"concurrency {concurrency} -> {new} ({reason})")
+        if new > concurrency:
+            self._wakeup()
@@ -2,9 +2,11 @@ import asyncio
 from typing import Type, Final, Set, Optional
 
 from pyler.core.engine import Engine
+from pyler.core.shard import ShardCoordinator
 from pyler.spiders import Spider
 from pyler.settings import Settings
-from pyler.utils import update_settings
+from pyler.utils import load_instance, update_settings
+from pyler.utils.logger import configure_logging
 
 
 class Crawler:
@@ -13,10 +15,13 @@ class Crawler:
         self.spidercls = spidercls # noqa
         self.spider: Optional[Spider] = None
         self.engine: Optional[Engine] = None
+        self.stats = None
         self.settings: Settings = settings.copy()
 
     async def crawl(self):
         self.spider = self._create_spider()
+        configure_logging(self.settings)
+        self.stats = self._create_stats()
         self.engine = self._create_engine()
         await self.engine.start(self.spider)
 
@@ -25,6 +30,9 @@ class Crawler:
         self.update_settings(spider=spider)
         return spider
 
+    def _create_stats(self):
+        return load_instance(self.settings.get("STATS_CLASS")).create_instance(self)
+
     def _create_engine(self) -> Engine:
         engine = Engine(self)
         return engine
@@ -48,6 +56,9 @@ class CrawlerProcess:
 
     @staticmethod
     async def _crawl(crawler):
+        if (workers := crawler.settings.getint("PROCESS_WORKERS", 1)) > 1:
+            # 多进程模式: 每个工作进程运行各自的引擎，请求按域名分片
+            return asyncio.create_task(ShardCoordinator(crawler, workers).run())
         return asyncio.create_task(crawler.crawl())
 
     async def start(self):
@@ -6,5 +6,13 @@ class UsageError(Exception):
     pass
 
 
-class DecodeFail(Exception):
+class DropItem(Exception):
+    pass
+
+
+class DownloadSizeExceeded(Exception):
+    pass
+
+
+class IgnoreRequest(Exception):
     pass
@@ -15,7 +15,8 @@ class Request:
             encoding: str = 'utf-8',
             priority: int = 0,
             proxy: Optional[dict] = None,
-            meta: Optional[dict] = None
+            meta: Optional[dict] = None,
+            dont_filter: bool = False
     ):
         self.url = url
         self.callback = callback
@@ -27,6 +28,15 @@ class Request:
         self.priority = priority
         self.proxy = proxy
         self._meta = meta if meta is not None else {}
+        self.dont_filter = dont_filter
+
+    def replace(self, **kwargs) -> "Request":
+        """复制一个新的请求，传入的参数替换原有的值，meta 为浅拷贝"""
+        for key in ("url", "callback", "method", "headers", "body", "cookies", "encoding", "priority", "proxy",
+                    "dont_filter"):
+            kwargs.setdefault(key, getattr(self, key))
+        kwargs.setdefault("meta", dict(self.meta))
+        return Request(kwargs.pop("url"), **kwargs)
 
     def __lt__(self, other):
         return self.priority < other.priority
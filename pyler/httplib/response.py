@@ -1,12 +1,16 @@
+import codecs
 import json
-import re
-from typing import Dict
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Optional
 from urllib.parse import urljoin as _urljoin
 
-from parsel import Selector
-
-from pyler.exceptions import DecodeFail
 from pyler.httplib.request import Request
+from pyler.utils.encoding import guess_encoding, resolve_encoding, sniff_encoding
+from pyler.utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from parsel import Selector
+
+logger = get_logger("Response")
 
 
 class Response:
@@ -18,53 +22,130 @@ class Response:
             request: Request,
             headers: Dict,
             body: bytes = b"",
-            status: int = 200
+            status: int = 200,
+            stream: Optional[AsyncIterator[bytes]] = None,
+            release: Optional[Callable[[], Awaitable]] = None
     ):
         self.url = url
         self.request = request
         self.headers = headers
         self.body = body
         self.status = status
-        self.encoding = self.request.encoding
+        # 流式模式下 body 为空，响应体通过 stream 按块读取
+        self.stream = stream
+        self._release = release
+        self._encoding: Optional[str] = None
         self._text_cache = None
-        self._Selector = None
+        self._selector: Optional["Selector"] = None
+
+    def header(self, name: str, default=None):
+        """不区分大小写地获取响应头"""
+        if (value := self.headers.get(name)) is not None:
+            return value
+        name = name.lower()
+        for key, value in self.headers.items():
+            if key.lower() == name:
+                return value
+        return default
+
+    def _is_utf(self) -> bool:
+        try:
+            return codecs.lookup(self.encoding).name.startswith("utf-")
+        except LookupError:
+            return False
+
+    def _ascii_compatible(self) -> bool:
+        """lxml 只能直接解析 ASCII 兼容的编码，utf-16/utf-32 需要 BOM 之外的字节序信息"""
+        try:
+            return "<a>".encode(self.encoding) == b"<a>"
+        except (LookupError, UnicodeError):
+            return False
 
     def json(self):
+        # json.loads 可以直接解析 utf-8/16/32 编码的 bytes, 不需要先解码成 text
+        if self._text_cache is None and self._is_utf():
+            return json.loads(self.body)
         return json.loads(self.text)
 
     @property
-    def text(self):
-        if self._text_cache is not None:
-            return self._text_cache
+    def encoding(self) -> str:
+        """响应的编码，只检测一次，text 和 selector 共用"""
+        if self._encoding is None:
+            encoding = sniff_encoding(self.body, self.header("Content-Type"))
+            self._encoding = encoding or self._guess_encoding()
+        return self._encoding
+
+    def _guess_encoding(self) -> str:
+        """
+        没有任何编码声明时先按请求的编码严格解码(解码结果留给 text 使用),
+        失败后根据内容猜测编码, 不再把整页替换成乱码
+        """
+        default = resolve_encoding(self.request.encoding) or "utf-8"
         try:
-            self._text_cache = self.body.decode(self.encoding)
+            self._text_cache = self.body.decode("utf-8-sig" if default == "utf-8" else default)
+            return default
         except UnicodeDecodeError:
-            _encoding_regexp = re.compile(r"charset=[\w-]+", flags=re.I)
-            content_type = self.headers.get("Content-Type", "") or self.headers.get("content-type", "")
-            _encoding = _encoding_regexp.search(content_type)
-            if _encoding:
-                _encoding = _encoding.group(1)
-                try:
-                    self._text_cache = self.body.decode(_encoding)
-                except UnicodeDecodeError as exc:
-                    raise UnicodeDecodeError(
-                        exc.encoding,
-                        exc.object,
-                        exc.start,
-                        exc.end,
-                        f"{self.request}"
-                    )
-            else:
-                raise DecodeFail(f"{self.request} {self.request.encoding} error.")
+            pass
+        encoding = guess_encoding(self.body)
+        logger.warning(f"{self.url} declares no encoding and is not valid {default}, decoding as {encoding}")
+        return encoding
+
+    @encoding.setter
+    def encoding(self, encoding: str):
+        self._encoding = encoding
+        self._text_cache = None
+        self._selector = None
+
+    @property
+    def text(self):
+        if self._text_cache is None:
+            # utf-8-sig 会去掉可能存在的 BOM; 编码已确定, 个别非法字节直接替换而不是重试其他编码
+            encoding = "utf-8-sig" if self.encoding == "utf-8" else self.encoding
+            # 没有编码声明时检测编码的过程中可能已经解码
+            if self._text_cache is None:
+                self._text_cache = self.body.decode(encoding, errors="replace")
         return self._text_cache
 
+    async def close(self):
+        """释放流式响应占用的连接"""
+        if self._release is not None:
+            release, self._release = self._release, None
+            await release()
+
     def urljoin(self, url):
         return _urljoin(self.url, url)
 
-    def xpath(self, xpath_exp):
-        if self._Selector is None:
-            self._Selector = Selector(self.text)
-        return self._Selector.xpath(xpath_exp)
+    @property
+    def selector(self) -> "Selector":
+        """直接从 body 构建的 Selector, 只构建一次, 由 xpath/css/re/jmespath 共享"""
+        if self._selector is None:
+            # parsel/lxml 导入较慢, 第一次使用选择器时才导入
+            from parsel import Selector
+            content_type = (self.header("Content-Type") or "").lower()
+            if "json" in content_type:
+                if codecs.lookup(self.encoding).name == "utf-8":
+                    self._selector = Selector(body=self.body, encoding="utf8", type="json", base_url=self.url)
+                else:
+                    self._selector = Selector(text=self.text, type="json", base_url=self.url)
+            else:
+                _type = "xml" if "xml" in content_type and "html" not in content_type else "html"
+                if self._ascii_compatible():
+                    self._selector = Selector(body=self.body, encoding=self.encoding, type=_type, base_url=self.url)
+                else:
+                    self._selector = Selector(text=self.text, type=_type, base_url=self.url)
+        return self._selector
+
+    def xpath(self, xpath_exp, **kwargs):
+        return self.selector.xpath(xpath_exp, **kwargs)
+
+    def css(self, css_exp):
+        return self.selector.css(css_exp)
+
+    def re(self, regex, replace_entities: bool = True):
+        return self.selector.re(regex, replace_entities=replace_entities)
+
+    def jmespath(self, jmespath_exp, **kwargs):
+        return self.selector.jmespath(jmespath_exp, **kwargs)
 
     def __str__(self):
         return f"<{self.request.method} {self.url} {self.status}>"
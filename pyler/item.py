@@ -2,6 +2,7 @@ from abc import ABCMeta
 from collections.abc import MutableMapping
 from copy import deepcopy
 from pprint import pformat
+from typing import Dict
 
 from pyler.exceptions import NotSupported, UsageError
 
@@ -10,24 +11,58 @@ class Field(dict):
     pass
 
 
+# 字段未赋值的占位
+_MISSING = object()
+
+
+class _FieldDescriptor:
+    """替换类属性中的 Field: 通过类访问时返回 Field, 通过实例访问或赋值时提示使用 item[key]"""
+
+    __slots__ = ("name", "field")
+
+    def __init__(self, name: str, field: Field):
+        self.name = name
+        self.field = field
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.field
+        raise UsageError(f"use item[{self.name!r}] to get field value")
+
+    def __set__(self, instance, value):
+        raise AttributeError(f"use item[{self.name!r}] = {value!r} to set field value")
+
+
 class ItemMeta(ABCMeta):
+    """
+    收集类及其基类中声明的 Field, 按声明顺序给每个字段分配下标,
+    实例只有一个按下标存放字段值的 list, 不再为每个 item 创建 dict
+    """
 
     def __new__(mcs, name, bases, attrs):
         fields = {}
-        for attr, value in attrs.items():
+        for base in reversed(bases):
+            fields.update(getattr(base, "fields", {}))
+        for attr, value in list(attrs.items()):
             if isinstance(value, Field):
                 fields[attr] = value
+                attrs[attr] = _FieldDescriptor(attr, value)
+        attrs.setdefault("__slots__", ())
         cls_instance = super().__new__(mcs, name, bases, attrs)
         cls_instance.fields = fields
+        cls_instance._field_index = {field: index for index, field in enumerate(fields)}
         return cls_instance
 
 
 class Item(MutableMapping, metaclass=ItemMeta):
 
-    fields: Field
+    __slots__ = ("_values",)
+
+    fields: Dict[str, Field]
+    _field_index: Dict[str, int]
 
     def __init__(self, *args, **kwargs):
-        self._values = {}
+        self._values = [_MISSING] * len(self._field_index)
         if args:
             raise NotSupported(f"{self.__class__.__name__} not support args, use keyword args")
         if kwargs:
@@ -35,46 +70,66 @@ class Item(MutableMapping, metaclass=ItemMeta):
                 self[key] = value
 
     def __setitem__(self, key, value):
-        if key in self.fields:
-            self._values[key] = value
-        else:
-            raise KeyError(f"{self.__class__.__name__}.{key} is not in fields")
+        try:
+            self._values[self._field_index[key]] = value
+        except KeyError:
+            raise KeyError(f"{self.__class__.__name__}.{key} is not in fields") from None
 
     def __getitem__(self, key):
-        return self._values[key]
+        value = self._values[self._field_index[key]]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
 
     def __delitem__(self, key):
-        del self._values[key]
+        index = self._field_index[key]
+        if self._values[index] is _MISSING:
+            raise KeyError(key)
+        self._values[index] = _MISSING
 
-    def __setattr__(self, key, value):
-        if key != '_values':
-            raise AttributeError(f"use item[{key!r}] = {value!r} to set field value")
-        super().__setattr__(key, value)
+    def __contains__(self, key):
+        index = self._field_index.get(key)
+        return index is not None and self._values[index] is not _MISSING
+
+    def get(self, key, default=None):
+        index = self._field_index.get(key)
+        if index is None or (value := self._values[index]) is _MISSING:
+            return default
+        return value
 
     def __getattr__(self, key):
         """当获取不到属性时会触发该方法"""
         raise AttributeError(f"{self.__class__.__name__} not support field: {key!r}")
 
-    def __getattribute__(self, item):
-        fields = super().__getattribute__("fields")
-        if item in fields:
-            raise UsageError(f"use item[{item!r}] to get field value")
-        else:
-            return super().__getattribute__(item)
-
     def __iter__(self):
-        return iter(self._values)
+        return (field for field, value in zip(self._field_index, self._values) if value is not _MISSING)
 
     def __len__(self):
-        return len(self._values)
+        return sum(value is not _MISSING for value in self._values)
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._values = [_MISSING] * len(self._field_index)
+        for key, value in state.items():
+            self[key] = value
 
     def __str__(self):
-        return pformat(dict(self._values))
+        return pformat(self.to_dict())
 
     __repr__ = __str__
 
     def to_dict(self):
-        return dict(self)
-
-    def copy(self):
-        return deepcopy(self)
+        return {field: value for field, value in zip(self._field_index, self._values) if value is not _MISSING}
+
+    def copy(self, deep: bool = True):
+        """deep=False 时只复制字段列表, 字段值与原 item 共享"""
+        if deep:
+            return deepcopy(self)
+        return self.__copy__()
+
+    def __copy__(self):
+        item = self.__class__.__new__(self.__class__)
+        item._values = self._values.copy()
+        return item
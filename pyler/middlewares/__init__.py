@@ -0,0 +1,94 @@
+from typing import Awaitable, Callable, Final, List, Optional, Union
+
+from pyler.httplib.request import Request
+from pyler.httplib.response import Response
+from pyler.utils import component_paths, load_instance, maybe_await
+from pyler.utils.logger import get_logger
+
+
+class DownloaderMiddleware:
+    """
+    下载器中间件基类，不强制继承，只需实现需要的钩子，钩子可以是普通函数或协程
+
+    process_request: 返回 None 继续下载, 返回 Response 跳过下载, 返回 Request 重新调度
+    process_response: 返回 Response 继续处理, 返回 Request 重新调度
+    process_exception: 返回 None 交给下一个中间件, 返回 Response 或 Request 时不再抛出异常
+    任何钩子抛出 IgnoreRequest 都会直接丢弃该请求
+    """
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls()
+
+    def process_request(self, request: Request, spider) -> Optional[Union[Request, Response]]:
+        return None
+
+    def process_response(self, request: Request, response: Response, spider) -> Union[Request, Response]:
+        return response
+
+    def process_exception(self, request: Request, exception: Exception, spider) -> Optional[Union[Request, Response]]:
+        return None
+
+
+class DownloaderMiddlewareManager:
+
+    def __init__(self, crawler, middlewares):
+        self.crawler = crawler
+        self.middlewares: Final[List] = list(middlewares)
+        # 只保存实现了对应钩子的中间件，process_response/process_exception 按相反顺序调用
+        self._request_hooks = [m.process_request for m in self.middlewares if hasattr(m, "process_request")]
+        self._response_hooks = [
+            m.process_response for m in reversed(self.middlewares) if hasattr(m, "process_response")
+        ]
+        self._exception_hooks = [
+            m.process_exception for m in reversed(self.middlewares) if hasattr(m, "process_exception")
+        ]
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+        setting = {**(settings.get("DOWNLOADER_MIDDLEWARES_BASE") or {}), **(settings.get("DOWNLOADER_MIDDLEWARES") or {})}
+        middlewares = []
+        for path in component_paths(setting):
+            middleware_cls = load_instance(path)
+            if hasattr(middleware_cls, "create_instance"):
+                middlewares.append(middleware_cls.create_instance(crawler))
+            else:
+                middlewares.append(middleware_cls())
+        return cls(crawler, middlewares)
+
+    @property
+    def spider(self):
+        return self.crawler.spider
+
+    async def download(
+            self, download: Callable[[Request], Awaitable[Response]], request: Request
+    ) -> Union[Request, Response]:
+        result = None
+        for hook in self._request_hooks:
+            if (result := await maybe_await(hook(request, self.spider))) is not None:
+                break
+        if result is None:
+            try:
+                result = await download(request)
+            except Exception as exc:
+                result = await self._process_exception(request, exc)
+        if isinstance(result, Response):
+            result = await self.process_response(request, result)
+        return result
+
+    async def process_response(self, request: Request, response: Response) -> Union[Request, Response]:
+        """只调用 process_response 钩子，用于没有经过下载的响应(如新鲜的缓存)"""
+        result = response
+        for hook in self._response_hooks:
+            result = await maybe_await(hook(request, result, self.spider))
+            if not isinstance(result, Response):
+                break
+        return result
+
+    async def _process_exception(self, request: Request, exception: Exception) -> Union[Request, Response]:
+        for hook in self._exception_hooks:
+            if (result := await maybe_await(hook(request, exception, self.spider))) is not None:
+                return result
+        raise exception
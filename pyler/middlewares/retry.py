@@ -0,0 +1,96 @@
+import random
+import sys
+from typing import List, Optional, Tuple, Type
+
+from pyler.exceptions import IgnoreRequest
+from pyler.httplib.request import Request
+from pyler.httplib.response import Response
+from pyler.utils import load_instance
+from pyler.utils.logger import SAMPLED, get_logger
+
+
+def _load_exceptions(paths) -> Tuple[Tuple[Type[BaseException], ...], List[str]]:
+    """
+    只加载所在模块已经导入的异常类, 返回 (异常类, 尚未加载的路径)
+    模块没有导入时不可能抛出其中的异常, 这样不会为了 RETRY_EXCEPTIONS 导入没有使用的下载器依赖(比如 httpx)
+    """
+    exceptions, pending = [], []
+    for path in paths:
+        if path.rsplit(".", 1)[0] not in sys.modules:
+            pending.append(path)
+            continue
+        try:
+            exceptions.append(load_instance(path))
+        except ImportError:
+            pass
+    return tuple(exceptions), pending
+
+
+class RetryMiddleware:
+    """
+    下载异常或响应状态码可重试时重新调度请求，等待时间按指数退避并加上随机抖动:
+        delay = uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** retries))
+    等待期间请求保存在引擎的延迟队列中，不占用并发
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        settings = crawler.settings
+        self.max_retry_times: int = settings.getint("RETRY_TIMES", 2)
+        self.retry_http_codes = set(int(code) for code in settings.get("RETRY_HTTP_CODES") or ())
+        self.retry_exceptions, self._pending_exceptions = _load_exceptions(settings.get("RETRY_EXCEPTIONS") or ())
+        self.backoff_base: float = settings.getfloat("RETRY_BACKOFF_BASE", 1.)
+        self.backoff_max: float = settings.getfloat("RETRY_BACKOFF_MAX", 60.)
+        self.priority_adjust: int = settings.getint("RETRY_PRIORITY_ADJUST")
+        self.stats = crawler.stats
+        self.logger = get_logger(self.__class__.__name__, settings.get("LOG_LEVEL"))
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request: Request, response: Response, spider) -> Response:
+        if request.meta.get("dont_retry") or response.status not in self.retry_http_codes:
+            return response
+        delay = self._retry_after(response)
+        if self._retry(request, f"status {response.status}", delay):
+            raise IgnoreRequest(f"{request} scheduled for retry")
+        return response
+
+    def process_exception(self, request: Request, exception: Exception, spider) -> Optional[Response]:
+        if self._pending_exceptions:
+            exceptions, self._pending_exceptions = _load_exceptions(self._pending_exceptions)
+            self.retry_exceptions += exceptions
+        if request.meta.get("dont_retry") or not isinstance(exception, self.retry_exceptions):
+            return None
+        if self._retry(request, type(exception).__name__):
+            raise IgnoreRequest(f"{request} scheduled for retry")
+        return None
+
+    @staticmethod
+    def _retry_after(response: Response) -> Optional[float]:
+        """429/503 响应中秒数形式的 Retry-After"""
+        try:
+            return float(response.header("Retry-After"))
+        except (TypeError, ValueError):
+            return None
+
+    def _retry(self, request: Request, reason: str, delay: Optional[float] = None) -> bool:
+        retries = request.meta.get("retry_times", 0) + 1
+        max_retry_times = request.meta.get("max_retry_times", self.max_retry_times)
+        if retries > max_retry_times:
+            self.stats.inc_value("retry/max_reached")
+            self.logger.warning(f"gave up retrying {request} (failed {retries} times): {reason}")
+            return False
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (retries - 1)))
+        retry_request = request.replace(
+            meta={**request.meta, "retry_times": retries},
+            priority=request.priority + self.priority_adjust,
+            dont_filter=True
+        )
+        self.stats.inc_value("retry/count")
+        self.stats.inc_value(f"retry/reason_count/{reason}")
+        self.logger.debug("retrying %s (failed %d times) in %.2fs: %s", request, retries, delay, reason, extra=SAMPLED)
+        self.crawler.engine.schedule_later(retry_request, delay)
+        return True
@@ -0,0 +1,164 @@
+import asyncio
+from typing import Final, List, Optional
+
+from pyler.exceptions import DropItem
+from pyler.item import Item
+from pyler.utils import component_paths, load_instance, maybe_await
+from pyler.utils.logger import SAMPLED, get_logger
+
+
+class Pipeline:
+    """
+    item pipeline 基类，不强制继承，只需实现需要的钩子
+
+    声明 batch_size 的 pipeline 会通过 process_items 批量接收 item,
+    攒够 batch_size 个或距第一个 item 超过 batch_interval 秒时触发一次
+    """
+
+    batch_size: int = 0
+    batch_interval: float = 0.
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls()
+
+    def open_spider(self, spider):
+        pass
+
+    def process_item(self, item: Item, spider) -> Optional[Item]:
+        return item
+
+    def process_items(self, items: List[Item], spider) -> Optional[List[Item]]:
+        return items
+
+    def close_spider(self, spider):
+        pass
+
+
+class _Stage:
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.batch_size: int = getattr(pipeline, "batch_size", 0) or 0
+        self.batch_interval: float = getattr(pipeline, "batch_interval", 0.) or 0.
+        self.buffer: List[Item] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # 每个阶段只有一个写入任务, 按顺序处理攒满的批次
+        self.flusher: Optional[asyncio.Task] = None
+
+    @property
+    def batched(self) -> bool:
+        return self.batch_size > 0
+
+    def __str__(self):
+        return type(self.pipeline).__name__
+
+
+class ItemPipelineManager:
+
+    def __init__(self, crawler, pipelines):
+        self.crawler = crawler
+        self.stages: Final[List[_Stage]] = [_Stage(pipeline) for pipeline in pipelines]
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+
+    @classmethod
+    def create_instance(cls, crawler):
+        pipelines = []
+        settings = crawler.settings
+        setting = {**(settings.get("ITEM_PIPELINES_BASE") or {}), **(settings.get("ITEM_PIPELINES") or {})}
+        for path in component_paths(setting):
+            pipeline_cls = load_instance(path)
+            if hasattr(pipeline_cls, "create_instance"):
+                pipelines.append(pipeline_cls.create_instance(crawler))
+            else:
+                pipelines.append(pipeline_cls())
+        return cls(crawler, pipelines)
+
+    @property
+    def spider(self):
+        return self.crawler.spider
+
+    async def open_spider(self):
+        for stage in self.stages:
+            if hasattr(stage.pipeline, "open_spider"):
+                await maybe_await(stage.pipeline.open_spider(self.spider))
+
+    async def process_item(self, item: Item):
+        await self._process([item], 0)
+
+    async def _process(self, items: List[Item], start: int):
+        for index in range(start, len(self.stages)):
+            stage = self.stages[index]
+            if stage.batched:
+                await self._buffer(stage, index, items)
+                return
+            items = [item for item in [await self._process_one(stage, item) for item in items] if item is not None]
+            if not items:
+                return
+
+    async def _process_one(self, stage: _Stage, item: Item) -> Optional[Item]:
+        try:
+            return await maybe_await(stage.pipeline.process_item(item, self.spider))
+        except DropItem as exc:
+            self.crawler.stats.inc_value("item_dropped_count")
+            self.logger.debug("%s dropped item: %s", stage, exc, extra=SAMPLED)
+        except Exception as exc:
+            self.logger.error(f"{stage} process_item error: {exc!r}")
+        return None
+
+    async def _buffer(self, stage: _Stage, index: int, items: List[Item]):
+        stage.buffer.extend(items)
+        # 攒满一批后等待写入任务处理完，processor 的消费者随之阻塞，item 不会在缓冲区中无限堆积
+        while len(stage.buffer) >= stage.batch_size:
+            self._start_flush(stage, index)
+            await asyncio.wait([stage.flusher])
+        if stage.buffer and stage.timer is None and stage.batch_interval > 0:
+            stage.timer = asyncio.get_running_loop().call_later(
+                stage.batch_interval, self._start_flush, stage, index, True
+            )
+
+    def _start_flush(self, stage: _Stage, index: int, force: bool = False):
+        """写入任务正在运行时不再创建新的任务，它会继续处理新攒满的批次"""
+        if stage.timer is not None:
+            stage.timer.cancel()
+            stage.timer = None
+        if stage.flusher is None or stage.flusher.done():
+            stage.flusher = asyncio.create_task(self._flush(stage, index, force))
+
+    async def _flush(self, stage: _Stage, index: int, force: bool = False):
+        """force 为 True 时不满一批的 item 也一起写入"""
+        while len(stage.buffer) >= stage.batch_size or (force and stage.buffer):
+            batch, stage.buffer = stage.buffer[:stage.batch_size], stage.buffer[stage.batch_size:]
+            try:
+                result = await maybe_await(stage.pipeline.process_items(batch, self.spider))
+            except DropItem as exc:
+                self.crawler.stats.inc_value("item_dropped_count", len(batch))
+                self.logger.debug("%s dropped %d items: %s", stage, len(batch), exc)
+                continue
+            except Exception as exc:
+                self.logger.error(f"{stage} process_items error: {exc!r}")
+                continue
+            if result is not None:
+                batch = list(result)
+            if batch:
+                await self._process(batch, index + 1)
+        if stage.buffer and stage.timer is None and stage.batch_interval > 0:
+            stage.timer = asyncio.get_running_loop().call_later(
+                stage.batch_interval, self._start_flush, stage, index, True
+            )
+
+    async def close_spider(self):
+        # 按顺序把每个批量阶段剩余的 item 推给后面的阶段
+        for index, stage in enumerate(self.stages):
+            while stage.buffer or (stage.flusher is not None and not stage.flusher.done()):
+                self._start_flush(stage, index, force=True)
+                await asyncio.wait([stage.flusher])
+        for stage in self.stages:
+            if stage.timer is not None:
+                stage.timer.cancel()
+                stage.timer = None
+            if hasattr(stage.pipeline, "close_spider"):
+                try:
+                    await maybe_await(stage.pipeline.close_spider(self.spider))
+                except Exception as exc:
+                    self.logger.error(f"{stage} close_spider error: {exc!r}")
@@ -0,0 +1,207 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final, List, Optional
+
+from pyler.exceptions import NotSupported, UsageError
+from pyler.item import Item
+from pyler.pipelines import Pipeline
+from pyler.utils import load_instance
+from pyler.utils.logger import get_logger
+
+
+class JsonLinesExporter:
+    """每个 item 一行 JSON"""
+
+    def __init__(self, fields: Optional[List[str]] = None, encoding: str = "utf-8"):
+        self.fields = fields
+        self.encoding = encoding
+        self._encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
+    def header(self) -> bytes:
+        return b""
+
+    def export(self, items: List[dict]) -> bytes:
+        encode = self._encoder.encode
+        if self.fields:
+            items = [{field: item.get(field) for field in self.fields} for item in items]
+        return "".join(encode(item) + "\n" for item in items).encode(self.encoding)
+
+
+class CsvExporter(JsonLinesExporter):
+    """未指定 fields 时使用第一批 item 中出现的字段作为表头, 之后的文件(包括轮转后的文件)保持同样的列"""
+
+    def header(self) -> bytes:
+        return self._write([self.fields])
+
+    def export(self, items: List[dict]) -> bytes:
+        if self.fields is None:
+            fields = {}
+            for item in items:
+                fields.update(dict.fromkeys(item))
+            self.fields = list(fields)
+        fields = self.fields
+        return self._write([item.get(field, "") for field in fields] for item in items)
+
+    def _write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode(self.encoding)
+
+
+class MsgpackExporter(JsonLinesExporter):
+    """item 依次打包为 msgpack 对象, 读取时使用 msgpack.Unpacker 流式解析, 需要安装 msgpack"""
+
+    def __init__(self, fields: Optional[List[str]] = None, encoding: str = "utf-8"):
+        super().__init__(fields, encoding)
+        try:
+            import msgpack
+        except ImportError:
+            raise NotSupported("msgpack feed format requires the msgpack package: pip install msgpack")
+        self._packer = msgpack.Packer(default=str)
+
+    def export(self, items: List[dict]) -> bytes:
+        pack = self._packer.pack
+        if self.fields:
+            items = [{field: item.get(field) for field in self.fields} for item in items]
+        return b"".join(pack(item) for item in items)
+
+
+class FeedWriter:
+    """
+    把序列化后的数据写入 uri 指定的文件, 只在后台线程中调用
+    uri 中可以使用 %(name)s 爬虫名称, %(time)s 启动时间, %(index)d 轮转序号
+    写满 max_items 个 item 或 max_bytes 字节(压缩前)后切换到下一个文件
+    """
+
+    def __init__(self, uri: str, exporter, spider_name: str, compress: bool = False,
+                 max_items: int = 0, max_bytes: int = 0):
+        if (max_items or max_bytes) and "%(index)" not in uri:
+            raise UsageError(f"feed {uri!r} rotates files, its uri must contain %(index)d")
+        self.uri = uri
+        self.exporter = exporter
+        self.compress = compress
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._params = {"name": spider_name, "time": time.strftime("%Y-%m-%dT%H-%M-%S"), "index": 0}
+        self._file = None
+        self._items: int = 0
+        self._bytes: int = 0
+        self.paths: Final[List[str]] = []
+
+    def write(self, items: List[dict]):
+        while items:
+            if self._file is not None and self._full():
+                self._close_file()
+            count = len(items)
+            if self.max_items:
+                count = min(count, self.max_items - self._items)
+            batch, items = items[:count], items[count:]
+            data = self.exporter.export(batch)
+            if self._file is None:
+                self._open_file()
+                data = self.exporter.header() + data
+            self._file.write(data)
+            self._items += len(batch)
+            self._bytes += len(data)
+
+    def _full(self) -> bool:
+        return (self.max_items and self._items >= self.max_items) or (self.max_bytes and self._bytes >= self.max_bytes)
+
+    def _open_file(self):
+        self._params["index"] += 1
+        path = self.uri % self._params
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(path, "wb") if self.compress else open(path, "wb")
+        self._items = self._bytes = 0
+        self.paths.append(path)
+
+    def _close_file(self):
+        self._file.close()
+        self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._close_file()
+
+
+class FeedExportPipeline(Pipeline):
+    """
+    按 FEEDS 配置把 item 导出为 jsonl/csv/msgpack 文件:
+        FEEDS = {"output/%(name)s-%(index)03d.jsonl.gz": {"format": "jsonl", "max_items": 100000}}
+    item 攒够 FEED_BATCH_SIZE 个后在单独的线程中批量序列化、压缩并写入, 不阻塞事件循环,
+    写完的 item 不再保留, 内存占用与抓取的 item 总数无关
+    """
+
+    def __init__(self, crawler, writers: List[FeedWriter], batch_size: int = 100, batch_interval: float = 1.):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.writers = writers
+        # 没有配置 FEEDS 时不批量收集, 直接透传
+        self.batch_size = batch_size if writers else 0
+        self.batch_interval = batch_interval
+        self.logger = get_logger(self.__class__.__name__, crawler.settings.get("LOG_LEVEL"))
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+        exporters = {**(settings.get("FEED_EXPORTERS_BASE") or {}), **(settings.get("FEED_EXPORTERS") or {})}
+        writers = []
+        for uri, options in (settings.get("FEEDS") or {}).items():
+            options = options or {}
+            compress = options.get("gzip", uri.endswith(".gz"))
+            feed_format = options.get("format") or os.path.splitext(uri[:-3] if uri.endswith(".gz") else uri)[1][1:]
+            if feed_format not in exporters:
+                raise NotSupported(f"unknown feed format {feed_format!r} for {uri!r}, available: {list(exporters)}")
+            exporter = load_instance(exporters[feed_format])(
+                fields=options.get("fields"), encoding=options.get("encoding", "utf-8")
+            )
+            writers.append(FeedWriter(
+                uri, exporter, str(crawler.spider), compress=compress,
+                max_items=options.get("max_items", 0), max_bytes=options.get("max_bytes", 0)
+            ))
+        return cls(
+            crawler,
+            writers,
+            batch_size=settings.getint("FEED_BATCH_SIZE", 100),
+            batch_interval=settings.getfloat("FEED_BATCH_INTERVAL", 1.)
+        )
+
+    def open_spider(self, spider):
+        if self.writers:
+            # 单线程保证同一个文件的写入顺序
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyler-feed")
+
+    async def process_items(self, items: List[Item], spider) -> List[Item]:
+        records = [item.to_dict() for item in items]
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._write, records)
+        self.stats.inc_value("feed/item_count", len(records))
+        return items
+
+    def _write(self, records: List[dict]):
+        for writer in self.writers:
+            writer.write(records)
+
+    async def close_spider(self, spider):
+        if self._executor is None:
+            return
+        # 排在所有未完成的写入之后执行
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+        self._executor = None
+
+    def _close(self):
+        for writer in self.writers:
+            try:
+                writer.close()
+            except Exception as exc:
+                self.logger.error(f"close feed {writer.uri} error: {exc!r}")
+            else:
+                self.logger.info(f"stored feed in {len(writer.paths)} file(s): {', '.join(writer.paths)}")
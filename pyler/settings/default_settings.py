@@ -1,12 +1,175 @@
 # 每个爬虫对应的并发数
 CONCURRENCY = 16
+# 是否根据下载延迟、异常和 429/503 响应自动调整全局并发, 启用后 CONCURRENCY 作为初始并发
+AUTOTHROTTLE_ENABLED = False
+# 自动调整的并发范围
+AUTOTHROTTLE_MIN_CONCURRENCY = 1
+AUTOTHROTTLE_MAX_CONCURRENCY = 64
+# 目标平均下载延迟(秒), 高于该值时降低并发
+AUTOTHROTTLE_TARGET_LATENCY = 1.0
+# 调整间隔(秒)
+AUTOTHROTTLE_INTERVAL = 1.0
+# 异常占比超过该值时按 AUTOTHROTTLE_BACKOFF_FACTOR 降低并发
+AUTOTHROTTLE_ERROR_RATIO = 0.1
+AUTOTHROTTLE_BACKOFF_FACTOR = 0.5
+# 表示被限流的响应状态码
+AUTOTHROTTLE_THROTTLE_CODES = [429, 503]
+# 每个域名的并发数
+CONCURRENCY_PER_DOMAIN = 8
+# 每个 IP 的并发数, 大于 0 时按 IP 而不是域名划分下载槽
+CONCURRENCY_PER_IP = 0
+# 所有下载槽中最多排队的请求数, 达到后引擎暂停从调度器取请求, 请求留在调度器(磁盘/远程队列)中
+DOWNLOAD_SLOT_BACKLOG = 100
+# 同一个下载槽两次请求之间的间隔(秒)
+DOWNLOAD_DELAY = 0
+# 是否在 0.5 ~ 1.5 倍 DOWNLOAD_DELAY 之间随机取间隔
+RANDOMIZE_DOWNLOAD_DELAY = True
 # 日志默认打印级别
 LOG_LEVEL = 'INFO'
+# 日志格式, 所有组件共用
+LOG_FORMAT = "%(asctime)s [%(name)s] %(levelname)s: %(message)s"
+# 日志先放入队列, 由后台线程格式化并写出, 高并发下打开 DEBUG 日志时不阻塞事件循环
+LOG_QUEUE = False
+# 逐请求的 DEBUG 日志(下载、重试、item 等)的采样比例, 1 表示全部输出
+LOG_DEBUG_SAMPLE_RATE = 1.0
+# 逐请求的 DEBUG 日志每秒最多输出多少条, 0 表示不限制
+LOG_DEBUG_RATE_LIMIT = 0
 # HTTP 超时时间
 DOWNLOAD_TIMEOUT = 60
+# 响应体的最大字节数, 超过后中止下载, 0 表示不限制
+DOWNLOAD_MAXSIZE = 1024 * 1024 * 1024
+# 响应体超过该字节数时打印警告, 0 表示不警告
+DOWNLOAD_WARNSIZE = 32 * 1024 * 1024
 # 是否验证证书
 VERIFY_SSL = False
-# 每个请求是否都需要新创建一个 session
-NEW_SESSION = False
+# 是否保存和发送服务端设置的 cookie; 设置 meta["cookiejar"] 的请求按值使用相互隔离的 cookie, 但共享连接池
+# (取代原来每个请求新建 session 的 NEW_SESSION)
+COOKIES_ENABLED = True
+# 连接池最大连接数, 0 表示不限制
+CONNECTION_LIMIT = 100
+# 每个主机的最大连接数, 0 表示不限制 (仅 AIOHTTPDownloader 支持)
+CONNECTION_LIMIT_PER_HOST = 0
+# 连接池保持的最大空闲长连接数
+KEEPALIVE_CONNECTIONS = 20
+# 空闲长连接的过期时间(秒)
+KEEPALIVE_EXPIRY = 5.0
+# DNS 解析结果的缓存时间(秒), 0 表示不缓存
+DNS_CACHE_TTL = 300
+# AIOHTTPDownloader 使用的 DNS resolver, 默认的 CachingResolver 在进程内缓存解析结果并合并同一主机的并发解析
+# 为 None 时使用 aiohttp 自带的 resolver 和连接器级别的缓存
+DNS_RESOLVER = "pyler.core.downloader.CachingResolver"
+# 是否启用 HTTP/2 (仅 HTTPXDownloader 支持)
+HTTP2_ENABLED = False
+# 是否启用 HTTP 缓存, 新鲜的缓存直接返回而不发送请求
+HTTPCACHE_ENABLED = False
+# 缓存目录, 每个爬虫一个子目录
+HTTPCACHE_DIR = ".httpcache"
+# 缓存过期时间(秒), 0 表示永不过期
+HTTPCACHE_EXPIRATION_SECS = 0
+# 缓存策略: DummyPolicy 总是使用缓存, RFCPolicy 按响应头判断新鲜度并用 ETag/Last-Modified 重新验证
+HTTPCACHE_POLICY = "pyler.core.httpcache.DummyPolicy"
+# 缓存存储
+HTTPCACHE_STORAGE = "pyler.core.httpcache.DiskCacheStorage"
+# 不缓存的响应状态码
+HTTPCACHE_IGNORE_HTTP_CODES = []
+# 下载器中间件, 格式为 {"path.to.Middleware": 顺序}, process_request 按顺序调用, process_response 按相反顺序调用
+# 值为 None 可以禁用 DOWNLOADER_MIDDLEWARES_BASE 中的中间件
+DOWNLOADER_MIDDLEWARES = {}
+DOWNLOADER_MIDDLEWARES_BASE = {
+    "pyler.middlewares.retry.RetryMiddleware": 550,
+}
+# 失败请求的最大重试次数, 可以用 meta["max_retry_times"] 单独指定, meta["dont_retry"] 为 True 时不重试
+RETRY_TIMES = 2
+# 需要重试的响应状态码
+RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
+# 需要重试的下载异常
+RETRY_EXCEPTIONS = [
+    "asyncio.TimeoutError",
+    "builtins.OSError",
+    "aiohttp.ClientError",
+    "httpx.TransportError",
+]
+# 重试的指数退避: 第 n 次重试等待 0 ~ min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (n - 1)) 秒
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 60.0
+# 重试请求的优先级调整, 数字越大越靠后
+RETRY_PRIORITY_ADJUST = 0
 # 指定框架使用哪个下载器
 DOWNLOADER = "pyler.core.downloader.AIOHTTPDownloader"
+# 调度器队列, 可选 pyler.utils.pqueue.DiskPriorityQueue 把请求溢出到磁盘,
+# pyler.utils.pqueue.RoundRobinQueue 每个域名一个队列, 域名之间轮流出队并跳过下载槽已满的域名
+SCHEDULER_QUEUE = "pyler.utils.pqueue.PriorityQueue"
+# 相同 priority 的请求的出队顺序: fifo 按入队顺序, bfs 深度小的优先(广度优先), dfs 深度大的优先(深度优先)
+SCHEDULER_ORDER = "fifo"
+# RoundRobinQueue 中每个域名每轮连续出队的请求数, 格式为 {域名: 权重}, 未配置的域名为 1
+SCHEDULER_DOMAIN_WEIGHTS = {}
+# 磁盘队列的存放目录, 为空时使用临时目录
+SCHEDULER_DISK_PATH = None
+# 磁盘队列中每个优先级常驻内存的请求数量
+SCHEDULER_DISK_HEAD_SIZE = 1000
+# 磁盘队列每个分段文件的最大请求数量
+SCHEDULER_DISK_SEGMENT_SIZE = 100_000
+# 共享队列服务(python -m pyler.core.queueserver)的地址,
+# 配合 SCHEDULER_QUEUE = "pyler.utils.pqueue.RemoteQueue" 使用, 此时去重由服务端完成, 可以把 DUPEFILTER 设为 None
+SCHEDULER_QUEUE_HOST = "127.0.0.1"
+SCHEDULER_QUEUE_PORT = 6380
+# 与共享队列服务批量交互的请求数量
+SCHEDULER_QUEUE_BATCH_SIZE = 100
+# 入队请求不足一批时最多等待多久发送(秒)
+SCHEDULER_QUEUE_FLUSH_INTERVAL = 0.5
+# 调度器中的请求少于该数量时才继续读取 start_requests, 避免海量种子占满内存或挤占爬取中发现的链接
+START_REQUESTS_LOW_WATER = 100
+# 请求去重类
+DUPEFILTER = "pyler.utils.dupefilters.RFDupeFilter"
+# 去重存储方式: set 为精确去重, bloom 为布隆过滤器(适用于上亿级别的请求)
+DUPEFILTER_MODE = "set"
+# 布隆过滤器预计容纳的请求数量
+DUPEFILTER_CAPACITY = 10_000_000
+# 布隆过滤器允许的误判率
+DUPEFILTER_ERROR_RATE = 0.001
+# 处理回调产出(Request/Item)的后台消费者数量
+PROCESSOR_CONCURRENCY = 4
+# 回调产出队列的最大长度, 队列满时回调会被阻塞
+PROCESSOR_QUEUE_SIZE = 1000
+# item pipeline, 格式为 {"path.to.Pipeline": 顺序}, 数字越小越先执行
+ITEM_PIPELINES = {}
+# 框架内置的 pipeline, 可以在 ITEM_PIPELINES 中把对应的顺序设为 None 禁用
+ITEM_PIPELINES_BASE = {"pyler.pipelines.feeds.FeedExportPipeline": 1000}
+# item 导出文件, 格式为 {uri: 选项}, uri 中可以使用 %(name)s 爬虫名称, %(time)s 启动时间, %(index)d 轮转序号
+# 选项: format(jsonl/csv/msgpack, 默认根据扩展名判断), gzip(默认根据 .gz 扩展名判断), fields, encoding,
+# max_items/max_bytes(写满后切换到下一个文件, 0 表示不轮转)
+FEEDS = {}
+# 导出格式对应的类
+FEED_EXPORTERS_BASE = {
+    "jsonl": "pyler.pipelines.feeds.JsonLinesExporter",
+    "csv": "pyler.pipelines.feeds.CsvExporter",
+    "msgpack": "pyler.pipelines.feeds.MsgpackExporter",
+}
+FEED_EXPORTERS = {}
+# 每攒够多少个 item 写入一次
+FEED_BATCH_SIZE = 100
+# 不足一批时最多等待多久写入(秒)
+FEED_BATCH_INTERVAL = 1.0
+# 回调的执行器: None 在事件循环中执行, "thread" 线程池, "process" 进程池
+# 只有被 @offload 装饰或 meta["offload"] 为 True 的回调才会放到执行器中
+PARSE_EXECUTOR = None
+# 执行器的工作线程/进程数量, 0 表示 CPU 核数
+PARSE_EXECUTOR_WORKERS = 0
+# 统计收集器, pyler.core.stats.DummyStatsCollector 不记录任何统计
+STATS_CLASS = "pyler.core.stats.StatsCollector"
+# 爬虫结束时是否在日志中输出全部统计
+STATS_DUMP = True
+# 定期在日志中输出抓取速度等摘要的间隔(秒), 0 表示不输出
+STATS_LOG_INTERVAL = 60
+# 提供 /metrics (Prometheus 文本格式) 和 /stats (JSON) 的本地 HTTP 端口, 0 表示不启动
+# 多进程模式下第 N 个工作进程使用 METRICS_PORT + N
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 0
+# 多进程模式下的工作进程数量, 大于 1 时请求按域名哈希分片到各个进程
+PROCESS_WORKERS = 1
+# 是否把各个工作进程产出的 item 汇总到主进程的 pipeline 中处理
+SHARD_AGGREGATE_ITEMS = True
+# 进程间批量转发请求和 item 的数量
+SHARD_BATCH_SIZE = 500
+# 进程间通信使用的 unix socket 目录, 为空时使用临时目录
+SHARD_SOCKET_DIR = None
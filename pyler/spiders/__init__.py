@@ -1,8 +1,12 @@
 from typing import List
 
+from pyler.core.executor import offload
 from pyler.httplib.request import Request
 from pyler.httplib.response import Response
 
+# 编写爬虫时可以直接 from pyler.spiders import Spider, offload
+__all__ = ["Spider", "offload"]
+
 
 class Spider:
 
@@ -18,8 +22,9 @@ class Spider:
         return o
 
     def start_requests(self):
+        """可以是普通生成器或异步生成器, 引擎只在调度器中的请求少于 START_REQUESTS_LOW_WATER 时才继续读取"""
         for url in self.start_urls:
-            yield Request(url, self.parse)
+            yield Request(url, callback=self.parse)
 
     def parse(self, response: Response):
         raise NotImplementedError(
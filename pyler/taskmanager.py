@@ -1,25 +1,34 @@
 import asyncio
-from typing import Coroutine, Final, Set
+from typing import Callable, Coroutine, Final, Optional, Set
 
 
 class TaskManager:
 
     def __init__(
             self,
-            maxconcurrency: int = 16
+            maxconcurrency: int = 16,
+            done_callback: Optional[Callable[[], None]] = None
     ):
         self._tasks: Final[Set] = set()
-        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(maxconcurrency)
+        self.maxconcurrency = maxconcurrency
+        self._done_callback = done_callback
 
     def create_task(self, coroutine: Coroutine) -> asyncio.Task:
         def done_callback(_fut: asyncio.Task) -> None:
             self._tasks.remove(task)
-            self.semaphore.release()
+            if self._done_callback is not None:
+                self._done_callback()
 
         task = asyncio.create_task(coroutine)
         self._tasks.add(task)
         task.add_done_callback(done_callback)
         return task
 
+    def full(self) -> bool:
+        return len(self._tasks) >= self.maxconcurrency
+
     def all_done(self) -> bool:
         return len(self._tasks) == 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
@@ -1,5 +1,6 @@
 from importlib import import_module
-from typing import Union, Callable
+from inspect import isawaitable
+from typing import AsyncIterator, Union, Callable, List
 
 
 from pyler.settings import Settings
@@ -29,3 +30,29 @@ def load_instance(_path: Union[str, Callable]):
     except AttributeError:
         raise NameError(f"module {filename} not exists or not found ")
     return cls
+
+
+def component_paths(setting) -> List:
+    """ITEM_PIPELINES 等组件配置可以是 {path: order} 或按顺序排列的列表, order 为 None 表示禁用"""
+    if isinstance(setting, dict):
+        enabled = [(path, order) for path, order in setting.items() if order is not None]
+        return [path for path, _order in sorted(enabled, key=lambda kv: kv[1])]
+    return list(setting)
+
+
+async def maybe_await(result):
+    if isawaitable(result):
+        return await result
+    return result
+
+
+async def _sync_to_async(iterable) -> AsyncIterator:
+    for item in iterable:
+        yield item
+
+
+def as_async_iterator(iterable) -> AsyncIterator:
+    """同步或异步可迭代对象统一转换为异步迭代器"""
+    if hasattr(iterable, "__aiter__"):
+        return iterable.__aiter__()
+    return _sync_to_async(iterable)
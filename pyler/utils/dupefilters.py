@@ -1,7 +1,157 @@
+import math
+from typing import Optional
 
+from pyler.httplib.request import Request
+from pyler.utils.logger import get_logger
+from pyler.utils.request import request_fingerprint
+
+
+class DigestSet:
+    """定长摘要的开放寻址哈希表，所有摘要连续存放在同一个 bytearray 中"""
+
+    def __init__(self, width: int = 16, capacity: int = 1024):
+        self.width = width
+        self._empty = bytes(width)
+        self._has_empty = False
+        self._size = 0
+        slots = 8
+        while slots * 0.7 < capacity:
+            slots <<= 1
+        self._mask = slots - 1
+        self._table = bytearray(slots * width)
+
+    def add(self, digest: bytes) -> bool:
+        """加入摘要，已存在时返回 False"""
+        if digest == self._empty:
+            added, self._has_empty = not self._has_empty, True
+            return added
+        width, table, mask = self.width, self._table, self._mask
+        index = int.from_bytes(digest[:8], "little") & mask
+        while True:
+            offset = index * width
+            slot = table[offset:offset + width]
+            if slot == digest:
+                return False
+            if slot == self._empty:
+                table[offset:offset + width] = digest
+                self._size += 1
+                if self._size > (mask + 1) * 0.7:
+                    self._grow()
+                return True
+            index = (index + 1) & mask
+
+    def __contains__(self, digest: bytes) -> bool:
+        if digest == self._empty:
+            return self._has_empty
+        width, table, mask = self.width, self._table, self._mask
+        index = int.from_bytes(digest[:8], "little") & mask
+        while True:
+            offset = index * width
+            slot = table[offset:offset + width]
+            if slot == digest:
+                return True
+            if slot == self._empty:
+                return False
+            index = (index + 1) & mask
+
+    def _grow(self):
+        width, old = self.width, self._table
+        self._mask = (self._mask << 1) | 1
+        self._table = bytearray(len(old) * 2)
+        self._size = 0
+        for offset in range(0, len(old), width):
+            digest = bytes(old[offset:offset + width])
+            if digest != self._empty:
+                self.add(digest)
+
+    def __len__(self) -> int:
+        return self._size + self._has_empty
+
+
+class BloomFilter:
+    """按预计容量和误判率分配位数组的布隆过滤器"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be between 0 and 1, but got {error_rate}")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._size = 0
+
+    def _indexes(self, digest: bytes):
+        # 双重哈希: 由摘要的两段派生出 k 个位置
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % num_bits
+
+    def add(self, digest: bytes) -> bool:
+        """加入摘要，(可能)已存在时返回 False"""
+        bits, added = self._bits, False
+        for index in self._indexes(digest):
+            byte, mask = index >> 3, 1 << (index & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        if added:
+            self._size += 1
+        return added
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self._bits
+        return all(bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(digest))
+
+    def __len__(self) -> int:
+        return self._size
 
 
 class RFDupeFilter:
 
-    def __init__(self):
-        pass
\ No newline at end of file
+    def __init__(
+            self,
+            mode: str = "set",
+            capacity: int = 10_000_000,
+            error_rate: float = 0.001,
+            log_level: Optional[str] = None
+    ):
+        self.logger = get_logger(self.__class__.__name__, log_level)
+        self.mode = mode.lower()
+        if self.mode == "set":
+            self.fingerprints = DigestSet(width=16)
+        elif self.mode == "bloom":
+            self.fingerprints = BloomFilter(capacity, error_rate)
+        else:
+            raise ValueError(f"DUPEFILTER_MODE support value are 'set' or 'bloom', but got {mode!r}")
+        self._overflow_warned = False
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            mode=settings.get("DUPEFILTER_MODE", "set"),
+            capacity=settings.getint("DUPEFILTER_CAPACITY", 10_000_000),
+            error_rate=settings.getfloat("DUPEFILTER_ERROR_RATE", 0.001),
+            log_level=settings.get("LOG_LEVEL")
+        )
+
+    def request_seen(self, request: Request) -> bool:
+        """请求是否已经出现过，未出现过的请求会被记录下来"""
+        added = self.fingerprints.add(request_fingerprint(request))
+        if added and not self._overflow_warned and isinstance(self.fingerprints, BloomFilter) \
+                and len(self.fingerprints) > self.fingerprints.capacity:
+            self._overflow_warned = True
+            self.logger.warning(
+                f"bloom filter is over capacity {self.fingerprints.capacity}, "
+                f"false positive rate will exceed {self.fingerprints.error_rate}"
+            )
+        return not added
+
+    def close(self):
+        pass
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
@@ -0,0 +1,81 @@
+import codecs
+import re
+from typing import Optional, Tuple
+
+
+_BOMS: Tuple[Tuple[bytes, str], ...] = (
+    # utf-32 的 BOM 以 utf-16 的 BOM 开头，需要先判断
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+)
+# 按 WHATWG 的做法把常见标签映射为兼容的超集编码
+_ALIASES = {
+    "ascii": "cp1252",
+    "iso8859-1": "cp1252",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+}
+_CONTENT_TYPE_CHARSET = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", flags=re.I)
+_META_CHARSET = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)|<\?xml[^>]+encoding\s*=\s*["']([\w.:-]+)""", flags=re.I
+)
+# 只在响应体的前几 KB 中查找 <meta> 声明
+SNIFF_SIZE = 4096
+
+
+def resolve_encoding(label: Optional[str]) -> Optional[str]:
+    """把编码标签规范化为 Python 的编码名称，不认识的标签返回 None"""
+    if not label:
+        return None
+    try:
+        name = codecs.lookup(label.strip()).name
+    except LookupError:
+        return None
+    return _ALIASES.get(name, name)
+
+
+def bom_encoding(body: bytes) -> Optional[str]:
+    for bom, encoding in _BOMS:
+        if body.startswith(bom):
+            return encoding
+    return None
+
+
+def content_type_encoding(content_type: Optional[str]) -> Optional[str]:
+    if content_type and (match := _CONTENT_TYPE_CHARSET.search(content_type)):
+        return resolve_encoding(match.group(1))
+    return None
+
+
+def declared_encoding(body: bytes) -> Optional[str]:
+    if match := _META_CHARSET.search(body, 0, SNIFF_SIZE):
+        encoding = resolve_encoding((match.group(1) or match.group(2)).decode("ascii"))
+        # 能用 ascii 读出 <meta> 的文档不可能是 utf-16/32
+        if encoding and encoding.startswith(("utf-16", "utf-32")):
+            return "utf-8"
+        return encoding
+    return None
+
+
+def sniff_encoding(body: bytes, content_type: Optional[str] = None) -> Optional[str]:
+    """依次根据 BOM、Content-Type、<meta> 声明判断编码，都没有声明时返回 None"""
+    return bom_encoding(body) or content_type_encoding(content_type) or declared_encoding(body)
+
+
+def detect_encoding(body: bytes, content_type: Optional[str] = None, default: str = "utf-8") -> str:
+    """没有编码声明时使用 default"""
+    return sniff_encoding(body, content_type) or resolve_encoding(default) or "utf-8"
+
+
+def guess_encoding(body: bytes) -> str:
+    """根据内容猜测编码: 安装了 charset_normalizer 时用它检测, 否则按 WHATWG 的做法使用 cp1252"""
+    try:
+        from charset_normalizer import from_bytes
+    except ImportError:
+        return "cp1252"
+    if (match := from_bytes(body).best()) is not None:
+        return resolve_encoding(match.encoding) or "cp1252"
+    return "cp1252"
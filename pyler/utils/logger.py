@@ -1,23 +1,106 @@
+import atexit
 import logging
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 
 
 LOG_FORMAT = F"%(asctime)s [%(name)s] %(levelname)s: %(message)s"
 
+# 传给 logger.debug(..., extra=SAMPLED) 的逐请求日志会按 LOG_DEBUG_SAMPLE_RATE/LOG_DEBUG_RATE_LIMIT 采样
+SAMPLED = {"sampled": True}
+
+
+class _LazyQueueHandler(QueueHandler):
+    """不在调用方格式化消息，record 原样放入队列，由后台线程格式化并写出"""
+
+    def prepare(self, record):
+        return record
+
+
+class _SamplingFilter(logging.Filter):
+    """只作用于带 SAMPLED 标记的 DEBUG 日志: 先按比例采样，再按每秒条数限流"""
+
+    def __init__(self, rate: float = 1., limit: float = 0.):
+        super().__init__()
+        self.rate = rate
+        self.limit = limit
+        self._tokens: float = limit
+        self._last: float = time.monotonic()
+        self.dropped: int = 0
+
+    def filter(self, record) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        if self.rate < 1 and random.random() >= self.rate:
+            self.dropped += 1
+            return False
+        if self.limit > 0:
+            now = time.monotonic()
+            self._tokens = min(self.limit, self._tokens + (now - self._last) * self.limit)
+            self._last = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return False
+            self._tokens -= 1
+        return True
+
 
 class Logger:
+    """
+    所有组件的 logger 都挂在同一个父 logger 上，共用一个 handler，由 configure 根据配置统一设置:
+    LOG_QUEUE 为 True 时日志先放入队列，由后台线程格式化并写入 stderr, 事件循环不会因为写日志阻塞
+    """
 
     _cache = {}
+    _root: logging.Logger = logging.Logger("pyler")
+    _listener: Optional[QueueListener] = None
+
+    @classmethod
+    def _stream_handler(cls, log_format: str = LOG_FORMAT) -> logging.Handler:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(log_format))
+        return handler
+
+    @classmethod
+    def configure(cls, settings=None):
+        """根据 LOG_QUEUE/LOG_FORMAT/LOG_DEBUG_SAMPLE_RATE/LOG_DEBUG_RATE_LIMIT 重新设置共用的 handler"""
+        get = settings.get if settings is not None else (lambda _key, default=None: default)
+        cls.stop()
+        for handler in list(cls._root.handlers):
+            cls._root.removeHandler(handler)
+        stream_handler = cls._stream_handler(get("LOG_FORMAT") or LOG_FORMAT)
+        if get("LOG_QUEUE", False):
+            handler = _LazyQueueHandler(queue.SimpleQueue())
+            cls._listener = QueueListener(handler.queue, stream_handler)
+            cls._listener.start()
+        else:
+            handler = stream_handler
+        sample_rate = float(get("LOG_DEBUG_SAMPLE_RATE", 1.) or 0.)
+        rate_limit = float(get("LOG_DEBUG_RATE_LIMIT", 0.) or 0.)
+        if sample_rate < 1 or rate_limit > 0:
+            handler.addFilter(_SamplingFilter(sample_rate, rate_limit))
+        cls._root.addHandler(handler)
+
+    @classmethod
+    def stop(cls):
+        """等待队列中的日志全部写出"""
+        if cls._listener is not None:
+            cls._listener.stop()
+            cls._listener = None
 
     @classmethod
     def get_logger(cls, name: str = "default", log_level=None, log_format=LOG_FORMAT):
 
         def _get_logger():
-            logger_format = logging.Formatter(log_format)
-            handler = logging.StreamHandler()
-            handler.setFormatter(logger_format)
-            handler.setLevel(log_level or logging.INFO)
             _logger = logging.Logger(name)
-            _logger.addHandler(handler)
+            _logger.parent = cls._root
+            if log_format != LOG_FORMAT:
+                # 单独指定格式的 logger 使用自己的 handler, 不经过共用的 handler
+                _logger.addHandler(cls._stream_handler(log_format))
+                _logger.propagate = False
             _logger.setLevel(log_level or logging.INFO)
             cls._cache[key] = _logger
             return _logger
@@ -25,4 +108,8 @@ class Logger:
         return cls._cache.get(key, None) or _get_logger()
 
 
+Logger.configure()
+atexit.register(Logger.stop)
+
 get_logger = Logger.get_logger
+configure_logging = Logger.configure
@@ -1,20 +1,529 @@
 import asyncio
-from typing import Optional
+import bisect
+import heapq
+import itertools
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Final, List, Optional, Tuple
+from urllib.parse import urlsplit
+
 from pyler.httplib.request import Request
+from pyler.utils.logger import get_logger
+from pyler.utils.request import request_fingerprint, request_to_dict, request_from_dict
+from pyler.utils.wire import read_message, write_message
+
+
+_ORDERS: Final = ("fifo", "bfs", "dfs")
+# 队列服务不可用时重试间隔的上限(秒)
+_MAX_RETRY_DELAY: Final = 30.
+
+
+def _order_key(request: Request, order: str) -> Tuple[int, ...]:
+    """
+    出队顺序: 先按 priority (数值越小越先出队), 再按 SCHEDULER_ORDER:
+        fifo 不考虑深度, bfs 浅的请求先出队, dfs 深的请求先出队
+    排序键相同的请求按入队顺序出队
+    """
+    if order == "bfs":
+        return request.priority, request.meta.get("depth", 0)
+    if order == "dfs":
+        return request.priority, -request.meta.get("depth", 0)
+    return request.priority,
+
+
+def _check_order(order: str) -> str:
+    if order not in _ORDERS:
+        raise ValueError(f"SCHEDULER_ORDER must be one of {_ORDERS}, got {order!r}")
+    return order
 
 
 class PriorityQueue(asyncio.PriorityQueue):
 
-    def __init__(self, maxsize=0):
+    def __init__(self, maxsize=0, order: str = "fifo"):
         super().__init__(maxsize=maxsize)
+        self.order = _check_order(order)
+        # 堆中保存 (排序键, 入队序号, 请求), 序号保证相同排序键的请求先进先出
+        self._counter = itertools.count()
+
+    @classmethod
+    def create_instance(cls, crawler):
+        return cls(order=crawler.settings.get("SCHEDULER_ORDER", "fifo"))
+
+    def _put(self, request: Request):
+        heapq.heappush(self._queue, (_order_key(request, self.order), next(self._counter), request))
+
+    def _get(self) -> Request:
+        return heapq.heappop(self._queue)[-1]
 
     async def get(self) -> Optional[Request]:
-        fut = super().get()
+        """队列为空时立即返回 None，由引擎在有新请求入队时再次唤醒"""
         try:
-            request = await asyncio.wait_for(
-                fut,
-                timeout=0.1
-            )
+            return self.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def close(self):
+        pass
+
+
+class RoundRobinQueue:
+    """
+    每个域名(或 meta["download_slot"])一个优先级队列，域名之间轮流出队，
+    某个域名突然产出大量链接时不会饿死其他域名;
+    SCHEDULER_DOMAIN_WEIGHTS 中的域名每轮可以连续出队多个请求，
+    下载槽已满、有请求在槽中排队或下载间隔未到的域名本轮跳过，请求留在调度器中而不是堆积到下载槽里
+    注意: priority 只在同一个域名内部生效; CONCURRENCY_PER_IP 模式下下载槽按 IP 划分，不会跳过繁忙的域名
+    """
+
+    def __init__(
+            self,
+            order: str = "fifo",
+            weights: Optional[Dict[str, int]] = None,
+            busy: Optional[Callable[[str], bool]] = None
+    ):
+        self.order = _check_order(order)
+        self.weights: Dict[str, int] = weights or {}
+        self._busy = busy
+        self.queues: Final[Dict[str, List[Tuple]]] = {}
+        # 有请求的域名，队首为当前轮到的域名
+        self._domains: Final[Deque[str]] = deque()
+        # 当前域名本轮已经出队的数量
+        self._served: int = 0
+        self._counter = itertools.count()
+        self._size: int = 0
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+
+        def busy(key: str) -> bool:
+            downloader = getattr(crawler.engine, "downloader", None)
+            return downloader is not None and downloader.slot_busy(key)
+
+        return cls(
+            order=settings.get("SCHEDULER_ORDER", "fifo"),
+            weights=settings.get("SCHEDULER_DOMAIN_WEIGHTS") or {},
+            busy=busy
+        )
+
+    @staticmethod
+    def _key(request: Request) -> str:
+        if (key := request.meta.get("download_slot")) is not None:
+            return key
+        return urlsplit(request.url).hostname or ""
+
+    async def put(self, request: Request):
+        key = self._key(request)
+        if (queue := self.queues.get(key)) is None:
+            queue = self.queues[key] = []
+            self._domains.append(key)
+        heapq.heappush(queue, (_order_key(request, self.order), next(self._counter), request))
+        self._size += 1
+
+    def _next_domain(self):
+        self._domains.rotate(-1)
+        self._served = 0
+
+    async def get(self) -> Optional[Request]:
+        """所有有请求的域名都在忙时返回 None, 下载完成后引擎会再次唤醒"""
+        domains = self._domains
+        for _ in range(len(domains)):
+            key = domains[0]
+            if self._busy is not None and self._busy(key):
+                self._next_domain()
+                continue
+            queue = self.queues[key]
+            request = heapq.heappop(queue)[-1]
+            self._size -= 1
+            self._served += 1
+            if not queue:
+                del self.queues[key]
+                domains.popleft()
+                self._served = 0
+            elif self._served >= self.weights.get(key, 1):
+                self._next_domain()
             return request
-        except asyncio.TimeoutError:
+        return None
+
+    def qsize(self) -> int:
+        return self._size
+
+    def close(self):
+        self.queues.clear()
+        self._domains.clear()
+        self._size = 0
+
+
+_HEADER = struct.Struct("<I")
+_REQUEST_FIELDS = (
+    "url", "callback", "method", "headers", "body", "cookies", "encoding", "priority", "proxy", "meta", "dont_filter"
+)
+
+
+def _encode_request(request: Request, spider) -> bytes:
+    d = request_to_dict(request, spider)
+    return pickle.dumps(tuple(d[field] for field in _REQUEST_FIELDS), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_request(data: bytes, spider) -> Request:
+    return request_from_dict(dict(zip(_REQUEST_FIELDS, pickle.loads(data))), spider)
+
+
+class _Segment:
+    """只追加写的分段文件，每条记录为 4 字节长度 + pickle 数据"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count: int = 0
+        self.read: int = 0
+        self._writer = open(path, "ab")
+        self._reader = None
+
+    def write(self, data: bytes):
+        self._writer.write(_HEADER.pack(len(data)))
+        self._writer.write(data)
+        self.count += 1
+
+    def read_many(self, n: int) -> List[bytes]:
+        if self._writer is not None:
+            self._writer.flush()
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        records = []
+        for _ in range(min(n, self.count - self.read)):
+            size, = _HEADER.unpack(self._reader.read(_HEADER.size))
+            records.append(self._reader.read(size))
+        self.read += len(records)
+        return records
+
+    def seal(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    @property
+    def sealed(self) -> bool:
+        return self._writer is None
+
+    def remove(self):
+        self.seal()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        os.remove(self.path)
+
+    def __len__(self):
+        return self.count - self.read
+
+
+class _DiskFifo:
+    """单个优先级的先进先出队列: 内存中保留队头，其余按顺序写入分段文件"""
+
+    def __init__(self, directory: str, prefix: str, head_size: int, segment_size: int, encode, decode):
+        self.directory = directory
+        self.prefix = prefix
+        self.head_size = head_size
+        self.segment_size = segment_size
+        self.head: Final[Deque[Request]] = deque()
+        self.segments: Final[Deque[_Segment]] = deque()
+        self._encode = encode
+        self._decode = decode
+        self._serial: int = 0
+        self._size: int = 0
+
+    def push(self, request: Request):
+        self._size += 1
+        # 已经有数据落盘时新请求也必须落盘，保证先进先出
+        if not self.segments and len(self.head) < self.head_size:
+            self.head.append(request)
+            return
+        if not self.segments or self.segments[-1].sealed or self.segments[-1].count >= self.segment_size:
+            if self.segments:
+                self.segments[-1].seal()
+            self._serial += 1
+            self.segments.append(_Segment(os.path.join(self.directory, f"{self.prefix}-{self._serial:08d}.seg")))
+        self.segments[-1].write(self._encode(request))
+
+    def pop(self) -> Optional[Request]:
+        if not self.head and self.segments:
+            self._refill()
+        if not self.head:
             return None
+        self._size -= 1
+        return self.head.popleft()
+
+    def _refill(self):
+        segment = self.segments[0]
+        self.head.extend(self._decode(data) for data in segment.read_many(self.head_size))
+        if not len(segment):
+            self.segments.popleft().remove()
+
+    def close(self):
+        while self.segments:
+            self.segments.popleft().remove()
+        self.head.clear()
+
+    def __len__(self):
+        return self._size
+
+
+class DiskPriorityQueue:
+    """
+    队头常驻内存、其余请求溢出到本地磁盘的优先级队列，每个排序键(优先级和 bfs/dfs 下的深度)一个磁盘 FIFO,
+    内存占用只与排序键数量和 SCHEDULER_DISK_HEAD_SIZE 有关，与队列长度无关
+    """
+
+    def __init__(
+            self,
+            spider,
+            directory: Optional[str] = None,
+            head_size: int = 1000,
+            segment_size: int = 100_000,
+            order: str = "fifo"
+    ):
+        self.spider = spider
+        self.order = _check_order(order)
+        self._own_directory = directory is None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="pyler-queue-")
+        else:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.head_size = head_size
+        self.segment_size = segment_size
+        self.queues: Final[Dict[Tuple[int, ...], _DiskFifo]] = {}
+        # 按从小到大排列的排序键，数值越小越先出队
+        self._keys: Final[List[Tuple[int, ...]]] = []
+        self._size: int = 0
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            crawler.spider,
+            directory=settings.get("SCHEDULER_DISK_PATH"),
+            head_size=settings.getint("SCHEDULER_DISK_HEAD_SIZE", 1000),
+            segment_size=settings.getint("SCHEDULER_DISK_SEGMENT_SIZE", 100_000),
+            order=settings.get("SCHEDULER_ORDER", "fifo")
+        )
+
+    def _encode(self, request: Request) -> bytes:
+        return _encode_request(request, self.spider)
+
+    def _decode(self, data: bytes) -> Request:
+        return _decode_request(data, self.spider)
+
+    async def put(self, request: Request):
+        key = _order_key(request, self.order)
+        if (queue := self.queues.get(key)) is None:
+            name = "p" + "_".join(map(str, key))
+            queue = self.queues[key] = _DiskFifo(
+                self.directory, name, self.head_size, self.segment_size, self._encode, self._decode
+            )
+            bisect.insort(self._keys, key)
+        queue.push(request)
+        self._size += 1
+
+    async def get(self) -> Optional[Request]:
+        if not self._keys:
+            return None
+        key = self._keys[0]
+        queue = self.queues[key]
+        request = queue.pop()
+        self._size -= 1
+        if not len(queue):
+            queue.close()
+            del self.queues[key]
+            self._keys.pop(0)
+        return request
+
+    def qsize(self) -> int:
+        return self._size
+
+    def close(self):
+        for queue in self.queues.values():
+            queue.close()
+        self.queues.clear()
+        self._keys.clear()
+        if self._own_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class RemoteQueue:
+    """
+    pyler.core.queueserver 的客户端，多个爬虫进程通过它共享同一个请求队列，
+    入队和出队都批量进行，避免每个请求一次网络往返；去重由服务端完成
+    """
+
+    def __init__(
+            self,
+            spider,
+            host: str = "127.0.0.1",
+            port: int = 6380,
+            batch_size: int = 100,
+            flush_interval: float = 0.5,
+            log_level: Optional[str] = None,
+            wakeup: Optional[Callable[[], None]] = None,
+            order: str = "fifo"
+    ):
+        self.spider = spider
+        self.order = _check_order(order)
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = get_logger(self.__class__.__name__, log_level)
+        self._pushes: List[tuple] = []
+        self._pops: Final[Deque[bytes]] = deque()
+        # 最近一次得知的服务端队列长度，连接出错后为 None 表示未知
+        self._remote_size: Optional[int] = 0
+        self._sending: int = 0
+        # 连接出错后在 _retry_time 之前不再访问服务端，间隔按连续失败次数翻倍
+        self._failures: int = 0
+        self._retry_time: float = 0.
+        self._wakeup = wakeup
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def create_instance(cls, crawler):
+        settings = crawler.settings
+
+        def wakeup():
+            if (engine := getattr(crawler, "engine", None)) is not None:
+                engine.wakeup()
+
+        return cls(
+            crawler.spider,
+            host=settings.get("SCHEDULER_QUEUE_HOST", "127.0.0.1"),
+            port=settings.getint("SCHEDULER_QUEUE_PORT", 6380),
+            batch_size=settings.getint("SCHEDULER_QUEUE_BATCH_SIZE", 100),
+            flush_interval=settings.getfloat("SCHEDULER_QUEUE_FLUSH_INTERVAL", 0.5),
+            log_level=settings.get("LOG_LEVEL"),
+            wakeup=wakeup,
+            order=settings.get("SCHEDULER_ORDER", "fifo")
+        )
+
+    async def _call(self, *message) -> tuple:
+        async with self._lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                write_message(self._writer, message)
+                await self._writer.drain()
+                reply = await read_message(self._reader)
+            except BaseException:
+                # 连接断开或读写被中断后流中的数据不再完整，下次调用时重新连接
+                self._writer.close()
+                self._reader = self._writer = None
+                raise
+        if reply[0] != "ok":
+            raise RuntimeError(f"queue server error: {reply[1]}")
+        self._failures = 0
+        return reply
+
+    def _backoff(self, exc: BaseException) -> float:
+        """记录连接错误，返回下次重试前等待的秒数，到期后唤醒引擎重新取请求"""
+        delay = min(_MAX_RETRY_DELAY, self.flush_interval * 2 ** self._failures)
+        self._failures += 1
+        self._retry_time = time.monotonic() + delay
+        self._remote_size = None
+        self.logger.error(f"queue server {self.host}:{self.port} error: {exc!r}, retry in {delay:.1f}s")
+        if self._wakeup is not None:
+            asyncio.get_running_loop().call_later(delay, self._wakeup)
+        return delay
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._retry_time
+
+    async def put(self, request: Request):
+        fingerprint = None if request.dont_filter else request_fingerprint(request)
+        # 服务端按排序键出队，bfs/dfs 的深度在客户端计算
+        self._pushes.append((fingerprint, _order_key(request, self.order), _encode_request(request, self.spider)))
+        if len(self._pushes) >= self.batch_size and self._available():
+            try:
+                await self.flush()
+            except (OSError, EOFError) as exc:
+                self._backoff(exc)
+        elif self._flush_timer is None:
+            # 入队不多时也要定时发送，让其他进程尽快拿到新请求
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_later)
+
+    def _flush_later(self):
+        self._flush_timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_in_background())
+
+    async def _flush_in_background(self):
+        delay = self.flush_interval
+        try:
+            if not self._available():
+                delay = self._retry_time - time.monotonic()
+            else:
+                await self.flush()
+        except (OSError, EOFError) as exc:
+            delay = self._backoff(exc)
+        except Exception as exc:
+            self.logger.error(f"push {len(self._pushes)} requests to {self.host}:{self.port} error: {exc!r}")
+        # 发送失败的请求已经放回缓冲区，稍后重试
+        if self._pushes and self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(delay, self._flush_later)
+
+    async def flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pushes:
+            return
+        batch, self._pushes = self._pushes, []
+        # 发送期间仍计入队列长度，避免引擎误判为空闲
+        self._sending += len(batch)
+        try:
+            _ok, _accepted, self._remote_size = await self._call("push", batch)
+        except BaseException:
+            # 放回缓冲区头部，保持入队顺序，下次 flush 时重新发送
+            self._pushes[:0] = batch
+            raise
+        finally:
+            self._sending -= len(batch)
+
+    async def get(self) -> Optional[Request]:
+        if not self._pops:
+            if not self._available():
+                return None
+            try:
+                await self.flush()
+                _ok, batch, self._remote_size = await self._call("pop", self.batch_size)
+            except (OSError, EOFError) as exc:
+                # 未发送的请求保留在缓冲区，等待重试后再从服务端取请求
+                self._backoff(exc)
+                return None
+            self._pops.extend(batch)
+        if not self._pops:
+            return None
+        return _decode_request(self._pops.popleft(), self.spider)
+
+    def qsize(self) -> int:
+        """本地缓冲加上最近一次得知的服务端队列长度，与服务端断开时至少为 1, 避免引擎误判为空闲"""
+        remote = 1 if self._remote_size is None else self._remote_size
+        return len(self._pops) + len(self._pushes) + self._sending + remote
+
+    def close(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._pushes or self._pops:
+            self.logger.warning(
+                f"{len(self._pushes)} unsent and {len(self._pops)} unconsumed requests are dropped on close"
+            )
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import re
+import string
+from typing import Callable, Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+from pyler.httplib.request import Request
+
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_UNRESERVED = frozenset(string.ascii_letters + string.digits + "-._~")
+_PERCENT_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+
+
+def _normalize_escape(match) -> str:
+    # 只解码非保留字符，%2F 等保留字符的转义保持原样(统一为大写), 否则 /a%2Fb 会和 /a/b 视为同一个 url
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else match.group(0).upper()
+
+
+def canonicalize_url(url: str) -> str:
+    """规范化 url: scheme/host 小写、去掉默认端口和 fragment、query 参数排序"""
+    scheme, netloc, path, query, _fragment = urlsplit(url)
+    scheme = scheme.lower()
+    netloc = netloc.lower()
+    host, sep, port = netloc.rpartition(":")
+    if sep and port.isdigit() and _DEFAULT_PORTS.get(scheme) == int(port):
+        netloc = host
+    path = quote(_PERCENT_ESCAPE.sub(_normalize_escape, path), safe="/%:@&=+$,;~!*'()") or "/"
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _body_bytes(body) -> bytes:
+    if body is None:
+        return b""
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if isinstance(body, dict):
+        return urlencode(sorted((str(k), str(v)) for k, v in body.items())).encode("utf-8")
+    return repr(body).encode("utf-8")
+
+
+def request_fingerprint(request: Request, digest_size: Optional[int] = 16) -> bytes:
+    """根据 method、规范化后的 url 和 body 计算定长的请求指纹"""
+    fp = hashlib.blake2b(digest_size=digest_size or 16)
+    fp.update(request.method.upper().encode("ascii"))
+    fp.update(b"\x00")
+    fp.update(canonicalize_url(request.url).encode("utf-8"))
+    fp.update(b"\x00")
+    fp.update(_body_bytes(request.body))
+    return fp.digest()
+
+
+def callback_name(callback, spider) -> Optional[str]:
+    if callback is None:
+        return None
+    if getattr(callback, "__self__", None) is spider and getattr(spider, callback.__name__, None) == callback:
+        return callback.__name__
+    raise ValueError(f"callback {callback!r} is not a method of spider {spider}, can not be serialized")
+
+
+def request_to_dict(request: Request, spider) -> dict:
+    """把 Request 转换为可序列化的 dict, 回调函数以爬虫方法名保存"""
+    return {
+        "url": request.url,
+        "callback": callback_name(request.callback, spider),
+        "method": request.method,
+        "headers": request.headers,
+        "body": request.body,
+        "cookies": request.cookies,
+        "encoding": request.encoding,
+        "priority": request.priority,
+        "proxy": request.proxy,
+        "meta": request.meta,
+        "dont_filter": request.dont_filter
+    }
+
+
+def request_from_dict(d: dict, spider) -> Request:
+    """根据 request_to_dict 的结果重建 Request"""
+    callback = d.get("callback")
+    return Request(
+        d["url"],
+        callback=getattr(spider, callback) if callback else None,
+        method=d["method"],
+        headers=d["headers"],
+        body=d["body"],
+        cookies=d["cookies"],
+        encoding=d["encoding"],
+        priority=d["priority"],
+        proxy=d["proxy"],
+        meta=d["meta"],
+        dont_filter=d["dont_filter"]
+    )
+
+
+def requests_from_file(path: str, callback: Optional[Callable] = None, encoding: str = "utf-8",
+                       **kwargs) -> Iterator[Request]:
+    """
+    逐行读取种子文件生成请求, 不会把整个文件读入内存, 空行和 # 开头的行会被跳过, .gz 文件自动解压
+    在 start_requests 中使用: yield from requests_from_file("urls.txt", callback=self.parse)
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding=encoding) as f:
+        for line in f:
+            url = line.strip()
+            if url and not url.startswith("#"):
+                yield Request(url, callback=callback, **kwargs)
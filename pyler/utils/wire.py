@@ -0,0 +1,18 @@
+import asyncio
+import pickle
+import struct
+from typing import Tuple
+
+
+# 进程间消息格式: 4 字节长度 + pickle 数据
+_HEADER = struct.Struct("<I")
+
+
+def write_message(writer: asyncio.StreamWriter, message: Tuple):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_HEADER.pack(len(data)) + data)
+
+
+async def read_message(reader: asyncio.StreamReader) -> Tuple:
+    size, = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return pickle.loads(await reader.readexactly(size))